@@ -0,0 +1,155 @@
+import JackAnalyzer
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+"""
+An asyncio driver for the analyzer, meant for large directories on slow (e.g. network backed) storage.
+The work of a directory is split into three stages connected by bounded queues:
+1. a reader prefetching the next source files,
+2. the compiler, running the synchronous JackTokenizer and CompilationEngine over one class at a time,
+3. a writer saving the finished Xxx.xml and Xxx.vm files in the background.
+A full queue blocks the stage feeding it, so memory stays bounded however large the directory is.
+A stage that fails stops the pipeline, its exception is raised to the caller instead of leaving the others waiting.
+"""
+
+PREFETCH = 4
+WRITE_BEHIND = 4
+
+
+def _read(file_path):
+    with open(file_path, 'r') as f:
+        return f.read()
+
+
+def _write(file_path, xml, vm):
+    # one buffered write per output instead of one write per xml element / vm command
+    with open(file_path[:-5] + '.xml', 'w') as f:
+        f.write(xml)
+    with open(file_path[:-5] + '.vm', 'w') as f:
+        f.write(vm)
+
+
+async def _until(operation, stages):
+    """
+    Awaits a queue operation of the compiler, unless one of the other stages fails first.
+    :param operation: awaitable, e.g. queue.get()
+    :param stages: list of the reader and writer tasks
+    :return: the result of operation
+    """
+    operation = asyncio.ensure_future(operation)
+    waiting = {operation, *stages}
+    while True:
+        done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        if operation in done:
+            return operation.result()
+        for stage in done:
+            if stage.exception() is not None:
+                # a stage that died will never get or put again, the compiler would wait forever
+                operation.cancel()
+                raise stage.exception()
+
+
+async def analyze_directory(dir_path, prefetch=PREFETCH, write_behind=WRITE_BEHIND):
+    """
+    Compiles all the .jack files of a directory, overlapping file I/O with compilation.
+    :param dir_path: String
+    :param prefetch: int, max number of sources read ahead of the compiler
+    :param write_behind: int, max number of compiled classes waiting to be written
+    :return: list of the compiled file paths
+    """
+    loop = asyncio.get_running_loop()
+    files = JackAnalyzer.jack_files(dir_path)
+    read_queue = asyncio.Queue(prefetch)
+    write_queue = asyncio.Queue(write_behind)
+
+    async def reader():
+        try:
+            for file in files:
+                source = await loop.run_in_executor(io_pool, _read, file)
+                await read_queue.put((file, source))
+        finally:
+            await read_queue.put(None)
+
+    async def writer():
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                return
+            await loop.run_in_executor(io_pool, _write, *item)
+
+    # the compiler gets its own thread so the event loop keeps feeding the I/O stages meanwhile
+    with ThreadPoolExecutor(2) as io_pool, ThreadPoolExecutor(1) as compile_pool:
+        reader_task = asyncio.ensure_future(reader())
+        writer_task = asyncio.ensure_future(writer())
+        stages = [reader_task, writer_task]
+        try:
+            while True:
+                item = await _until(read_queue.get(), stages)
+                if item is None:
+                    break
+                file, source = item
+                xml, vm = await loop.run_in_executor(compile_pool, JackAnalyzer.compile_source, source)
+                await _until(write_queue.put((file, xml, vm)), stages)
+            await _until(write_queue.put(None), stages)
+            await asyncio.gather(reader_task, writer_task)
+        finally:
+            reader_task.cancel()
+            writer_task.cancel()
+    return files
+
+
+def analyze(dir_path, prefetch=PREFETCH, write_behind=WRITE_BEHIND):
+    """
+    Synchronous entry point of analyze_directory
+    """
+    return asyncio.run(analyze_directory(dir_path, prefetch, write_behind))
+
+
+def compare_with_serial(dir_path, repeat=3, prefetch=PREFETCH, write_behind=WRITE_BEHIND):
+    """
+    Times the asyncio pipeline against the serial JackAnalyzer loop on the same directory.
+    :param dir_path: String
+    :param repeat: int, the best of that many runs is kept for each driver
+    :return: dict, driver -> seconds
+    """
+    def serial():
+        for file in JackAnalyzer.jack_files(dir_path):
+            JackAnalyzer.analyzer(file)
+
+    timings = {}
+    for name, run in (('serial', serial),
+                      ('async', lambda: analyze(dir_path, prefetch, write_behind))):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='asyncio driven Jack analyzer')
+    parser.add_argument('path', help='directory of .jack files')
+    parser.add_argument('--prefetch', type=int, default=PREFETCH,
+                        help='number of source files read ahead of the compiler')
+    parser.add_argument('--write-behind', type=int, default=WRITE_BEHIND,
+                        help='number of compiled classes buffered for writing')
+    parser.add_argument('--compare', type=int, metavar='REPEAT', default=0,
+                        help='benchmark against the serial loop, best of REPEAT runs')
+    args = parser.parse_args(args)
+
+    path = args.path.rstrip('/')
+    if args.compare:
+        timings = compare_with_serial(path, args.compare, args.prefetch, args.write_behind)
+        for name, seconds in timings.items():
+            print('{:<8}{:10.1f} ms'.format(name, seconds * 1000))
+        print('speedup {:.2f}x'.format(timings['serial'] / timings['async']))
+    else:
+        analyze(path, args.prefetch, args.write_behind)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,42 @@
+import SignatureIndex
 import SymbolTable
 import VMWriter
 
-OP = ['+', '-', '*', '/', '&amp;', '|', '&lt;', '&gt;', '=']
-UNARY_OP = ['-', '~']
-KEYWORD_CONSTANT = ['true', 'false', 'null', 'this']
-TYPES = ['int', 'char', 'boolean', 'void']
+OP = frozenset(['+', '-', '*', '/', '&amp;', '|', '&lt;', '&gt;', '='])
+UNARY_OP = frozenset(['-', '~'])
+KEYWORD_CONSTANT = frozenset(['true', 'false', 'null', 'this'])
+TYPES = frozenset(['int', 'char', 'boolean', 'void'])
+PRIMITIVE_TYPES = frozenset(['int', 'char', 'boolean'])
+CLASS_VAR_KINDS = frozenset(['static', 'field'])
+SUBROUTINE_KINDS = frozenset(['constructor', 'function', 'method'])
+# term dispatch of compile_term, keyed by the type of the first token, or its value for symbols.
+# Unary operators are consumed before the dispatch, identifiers dispatch on IDENTIFIER_TERMS
+TERMS = {'integerConstant': 'write_elementary_expression_and_advance',
+         'stringConstant': 'write_elementary_expression_and_advance',
+         'keyword': 'write_elementary_expression_and_advance',
+         '(': '_term_parenthesized'}
+# identifier terms, keyed by the token after the identifier
+IDENTIFIER_TERMS = {'[': '_term_array',
+                    '.': 'compile_subroutine_call'}
+# statement dispatch of compile_statements, keyed by the statement's first keyword.
+# Method names rather than functions, so instrumentation patching the class is honoured
+STATEMENTS = {'let': 'compile_let',
+              'if': 'compile_if',
+              'while': 'compile_while',
+              'do': 'compile_do',
+              'return': 'compile_return'}
 
 
 class CompilationEngine:
-    def __init__(self, input_file, output_file, output_vm_path):
+    def __init__(self, input_file, output_file, output_vm_path, signature_index=None):
         """
         Creates a new compilation engine with the given input and output.
         The next routine called must be compileClass().
         :param input_file: JackTokenizer
         :param output_file: File
+        :param output_vm_path: String, or a text stream the VM code is written to
+        :param signature_index: SignatureIndex.SignatureIndex, calls to other classes are resolved
+                                against it (default SignatureIndex.INDEX)
         """
         self.tk = input_file
         self.f = output_file
@@ -23,6 +46,14 @@ class CompilationEngine:
         self.current_class = ""
         self.current_subroutine = ""
         self.current_ret_type = ""
+        # full name -> Signature of the subroutines compiled so far
+        self.subroutines = {}
+        # subroutine name -> Signature of all the subroutines of this class, scanned on the first call
+        # to one of them that is not compiled yet
+        self.class_signatures = None
+        self.signature_index = signature_index if signature_index is not None else SignatureIndex.INDEX
+        # set by a do statement whose void call leaves the value the following return needs
+        self._void_result_on_stack = False
 
     def compile_class(self):
         """
@@ -50,11 +81,12 @@ class CompilationEngine:
         return
 
     def write_elementary_expression_and_advance(self, is_advance=True):
-        assert self.tk.token_type() != 'identifier'
-        self.f.write("<{0}> {1} </{0}>\n".format(self.tk.token_type(),
-                                                 self.tk.token_val()))
+        tk = self.tk
+        token_type = tk.token_type()
+        assert token_type != 'identifier'
+        self.f.write("<{0}> {1} </{0}>\n".format(token_type, tk.token_val()))
         if is_advance:
-            self.tk.advance()
+            tk.advance()
 
     def write_identifier_and_advance(self, category, usage, index=False):
         if index is False:
@@ -77,7 +109,7 @@ class CompilationEngine:
         :return:
         """
 
-        while self.tk.token_val() in ['static', 'field']:
+        while self.tk.token_val() in CLASS_VAR_KINDS:
             # compile one declaration
             self.f.write("<classVarDec>\n")
 
@@ -91,15 +123,13 @@ class CompilationEngine:
                 self.write_identifier_and_advance('class','call')
             assert self.is_var_name()
             name = self.tk.token_val()
-            self.symbol_table.define(name, o_type, kind)
-            index = self.symbol_table.index_of(name)
+            index = self.symbol_table.define(name, o_type, kind).index
             self.write_identifier_and_advance(kind, 'definition', index)
             while self.tk.token_val() == ',':
                 self.write_elementary_expression_and_advance()
                 assert self.is_var_name()
                 name = self.tk.token_val()
-                self.symbol_table.define(name,o_type,kind)
-                index = self.symbol_table.index_of(name)
+                index = self.symbol_table.define(name, o_type, kind).index
                 self.write_identifier_and_advance(kind,'definition',index)
             assert self.tk.token_val() == ';'
             self.write_elementary_expression_and_advance()
@@ -108,6 +138,17 @@ class CompilationEngine:
 
         return
 
+    def lookup_var(self, name):
+        """
+        returns the symbol table entry of a variable, in a single probe
+        :param name: String
+        :return: SymbolTable.Symbol
+        """
+        symbol = self.symbol_table.lookup(name)
+        if symbol is None:
+            raise Exception('identifier not found')
+        return symbol
+
     def is_var_name(self):
         return self.tk.token_type() == 'identifier'
 
@@ -119,12 +160,7 @@ class CompilationEngine:
         returns true if current token is a type
         :return:
         """
-        if self.tk.token_val() in ['int', 'char', 'boolean']:
-            return True
-        elif self.tk.token_type() == 'identifier':  # className
-            return True
-        else:
-            return False
+        return self.tk.token_val() in PRIMITIVE_TYPES or self.tk.token_type() == 'identifier'  # className
 
     def compile_subroutine(self):
         """
@@ -137,7 +173,9 @@ class CompilationEngine:
         :return:
         """
         self.f.write("<subroutineDec>\n")
-        while self.tk.token_val() in ['constructor', 'function', 'method']:
+        self.symbol_table.start_subroutine()
+        while self.tk.token_val() in SUBROUTINE_KINDS:
+            kind = self.tk.token_val()
             self.write_elementary_expression_and_advance()
 
             assert (self.is_type() | (self.tk.token_val() == 'void')), 'expected "void"|type'
@@ -155,12 +193,16 @@ class CompilationEngine:
             assert self.tk.token_val() == '(', 'expected "("'
             self.write_elementary_expression_and_advance()
 
+            if kind == 'method':
+                # argument 0 of a method is the object it was called on
+                self.symbol_table.define('this', self.current_class, 'ARG')
             n_args = self.compile_parameter_list()
 
             assert self.tk.token_val() == ')', 'expected ")"'
             self.write_elementary_expression_and_advance()
 
-            self.writer.write_function(self.current_class+self.current_subroutine, n_args)
+            full_name = self.current_class + '.' + self.current_subroutine
+            self.subroutines[full_name] = SignatureIndex.Signature(kind, self.current_ret_type, n_args)
             #  compile subroutine body:
             self.f.write("<subroutineBody>\n")
 
@@ -169,6 +211,7 @@ class CompilationEngine:
 
             while self.tk.token_val() == 'var':
                 self.compile_var_dec()
+            self.writer.write_function(full_name, self.symbol_table.var_count('VAR'))
 
             self.compile_statements()
 
@@ -203,8 +246,7 @@ class CompilationEngine:
             assert self.is_var_name(), 'expected var name'
             name = self.tk.token_val()
             kind = 'ARG'
-            self.symbol_table.define(name, type, kind)
-            index = self.symbol_table.index_of(name)
+            index = self.symbol_table.define(name, type, kind).index
             self.write_identifier_and_advance(kind, 'definition', index)
             n_args += 1
 
@@ -217,8 +259,7 @@ class CompilationEngine:
 
                 assert self.is_var_name()
                 name = self.tk.token_val()
-                self.symbol_table.define(name, type, kind)
-                index = self.symbol_table.index_of(name)
+                index = self.symbol_table.define(name, type, kind).index
                 self.write_identifier_and_advance(kind, 'definition', index)
                 n_args += 1
         self.f.write("</parameterList>\n")
@@ -236,22 +277,20 @@ class CompilationEngine:
         self.write_elementary_expression_and_advance()
         assert self.is_type()
         type = self.tk.token_val()
-        if type in ['int','char','boolean']:
+        if type in PRIMITIVE_TYPES:
             self.write_elementary_expression_and_advance()
         else:
             # className
             self.write_identifier_and_advance('class', 'call')
         assert self.is_var_name()
         name = self.tk.token_val()
-        self.symbol_table.define(name,type,kind)
-        index = self.symbol_table.index_of(name)
+        index = self.symbol_table.define(name, type, kind).index
         self.write_identifier_and_advance(kind,'definition',index)
         while self.tk.token_val() == ',':
             self.write_elementary_expression_and_advance()
             assert self.is_var_name()
             name = self.tk.token_val()
-            self.symbol_table.define(name, type, kind)
-            index = self.symbol_table.index_of(name)
+            index = self.symbol_table.define(name, type, kind).index
             self.write_identifier_and_advance(kind, 'definition', index)
 
         assert self.tk.token_val() == ';'
@@ -266,19 +305,10 @@ class CompilationEngine:
         :return:
         """
         self.f.write("<statements>\n")
-        while self.tk.token_val() in ['let', 'if', 'while', 'do', 'return']:
-            if self.tk.token_val() == 'return':
-                self.compile_return()
-            elif self.tk.token_val() == 'if':
-                self.compile_if()
-            elif self.tk.token_val() == 'let':
-                self.compile_let()
-            elif self.tk.token_val() == 'do':
-                self.compile_do()
-            elif self.tk.token_val() == 'while':
-                self.compile_while()
-            else:
-                raise Exception("unknown statement")
+        compile_statement = STATEMENTS.get(self.tk.token_val())
+        while compile_statement is not None:
+            getattr(self, compile_statement)()
+            compile_statement = STATEMENTS.get(self.tk.token_val())
         self.f.write("</statements>\n")
         return
 
@@ -291,10 +321,15 @@ class CompilationEngine:
         self.f.write("<doStatement>\n")
         assert self.tk.token_val() == 'do'
         self.write_elementary_expression_and_advance()
-        self.compile_subroutine_call()
-        self.writer.write_pop('temp', 0)
+        signature = self.compile_subroutine_call()
         assert self.tk.token_val() == ';'
         self.write_elementary_expression_and_advance()
+        if signature is not None and signature.type == 'void' and self.current_ret_type == 'void' and \
+                self.tk.token_val() == 'return':
+            # the 0 the void callee returned is the 0 this void subroutine returns
+            self._void_result_on_stack = True
+        else:
+            self.writer.write_pop('temp', 0)
         self.f.write("</doStatement>\n")
         return
 
@@ -303,33 +338,68 @@ class CompilationEngine:
         Compiles a subroutineCall
         format: subroutineName '(' expressionList ')' | (className|varName)
                                '.' subroutineName '(' expressionList ')'
+        :return: SignatureIndex.Signature of the callee, or None if it is not known
         """
         assert self.tk.token_type() == 'identifier'
-        name = self.tk.token_type()
+        name = self.tk.token_val()
         if self.tk.peek_next_val() == '.':
             # className/varName
-            if self.symbol_table.is_in_table(name):
-                # varName
-                category = self.symbol_table.kind_of(name)
-                index = self.symbol_table.index_of(name)
-                self.write_identifier_and_advance(category, 'call', index)
+            symbol = self.symbol_table.lookup(name)
+            if symbol is not None:
+                # varName, a method called on the object it holds
+                self.writer.write_push(symbol.segment, symbol.index)
+                callee_class = symbol.type
+                is_method = True
+                self.write_identifier_and_advance(symbol.kind, 'call', symbol.index)
             else:
                 # className
+                callee_class = name
+                is_method = False
                 self.write_identifier_and_advance('class', 'call')
-        else:
-            # subroutineName
-            self.write_identifier_and_advance('subroutine', 'call')
-
-        if self.tk.token_val() == '.':
             self.write_elementary_expression_and_advance()
             assert self.is_subroutine_name()
-            self.write_identifier_and_advance('subroutine', 'call')
+            subroutine = self.tk.token_val()
+            signature = self.signature_of(callee_class, subroutine)
+            if signature is not None and (signature.kind == 'method') != is_method:
+                raise Exception('{} {}.{} called {}'.format(signature.kind, callee_class, subroutine,
+                                                            'on an object' if is_method else 'without an object'))
+        else:
+            # subroutineName of this class, called on this unless it is a function or a constructor
+            callee_class = self.current_class
+            subroutine = name
+            signature = self.signature_of(callee_class, subroutine)
+            is_method = signature is None or signature.kind == 'method'
+            if is_method:
+                self.writer.write_push('pointer', 0)
+        self.write_identifier_and_advance('subroutine', 'call')
+
         assert self.tk.token_val() == '('
         self.write_elementary_expression_and_advance()
-        self.compile_expression_list()
+        n_args = self.compile_expression_list()
         assert self.tk.token_val() == ')'
         self.write_elementary_expression_and_advance()
-        return
+        if signature is not None and n_args != signature.n_params:
+            raise Exception('{}.{} takes {} arguments, called with {}'.format(callee_class, subroutine,
+                                                                             signature.n_params, n_args))
+        self.writer.write_call(callee_class + '.' + subroutine, n_args + 1 if is_method else n_args)
+        return signature
+
+    def signature_of(self, class_name, subroutine):
+        """
+        :param class_name: String
+        :param subroutine: String
+        :return: SignatureIndex.Signature of the callee, or None if it is not known
+        """
+        if class_name == self.current_class:
+            signature = self.subroutines.get(class_name + '.' + subroutine)
+            if signature is not None:
+                return signature
+            if self.class_signatures is None:
+                self.class_signatures = SignatureIndex.scan(self.tk.token_str_list)[1]
+            signature = self.class_signatures.get(subroutine)
+            if signature is not None:
+                return signature
+        return self.signature_index.lookup(class_name, subroutine)
 
     def compile_let(self):
         """
@@ -342,9 +412,8 @@ class CompilationEngine:
         self.write_elementary_expression_and_advance()
         assert self.is_var_name()
         name = self.tk.token_val()
-        kind = self.symbol_table.kind_of(name)
-        index = self.symbol_table.index_of(name)
-        self.write_identifier_and_advance(kind,'call',index)
+        symbol = self.lookup_var(name)
+        self.write_identifier_and_advance(symbol.kind, 'call', symbol.index)
         if self.tk.token_val() == "[":
             self.write_elementary_expression_and_advance()
             self.compile_expression()
@@ -388,7 +457,9 @@ class CompilationEngine:
         """
         self.f.write("<returnStatement>\n")
         assert self.tk.token_val() == 'return'
-        if self.current_ret_type == 'void':
+        if self._void_result_on_stack:
+            self._void_result_on_stack = False
+        elif self.current_ret_type == 'void':
             self.writer.write_push('constant', 0)
         self.writer.write_return()
         self.write_elementary_expression_and_advance()
@@ -439,8 +510,9 @@ class CompilationEngine:
         :return:
         """
         self.f.write("<expression>\n")
+        tk = self.tk
         self.compile_term()
-        while self.tk.token_val() in OP:
+        while tk.token_val() in OP:
             self.write_elementary_expression_and_advance()
             self.compile_term()
         self.f.write("</expression>\n")
@@ -461,50 +533,60 @@ class CompilationEngine:
         :return:
         """
         self.f.write("<term>\n")
-        if self.tk.peek_next_val() == '[':
-            assert self.is_var_name()
-            # varName
-            name = self.tk.token_val()
-            category = self.symbol_table.kind_of(name)
-            index = self.symbol_table.index_of(name)
-            self.write_identifier_and_advance(category, 'call', index)
-            self.write_elementary_expression_and_advance()  # '['
-            self.compile_expression()
-            assert self.tk.token_val() == ']'
-            self.write_elementary_expression_and_advance()
-        elif self.tk.peek_next_val() == '.':
-            self.compile_subroutine_call()
-
-        elif self.tk.token_val() == '(':
-            self.write_elementary_expression_and_advance()
-            self.compile_expression()
-            assert self.tk.token_val() == ')'
-            self.write_elementary_expression_and_advance()
-        elif self.tk.token_val() in UNARY_OP:
-            self.write_elementary_expression_and_advance()
-            self.compile_term()
-        elif self.tk.token_type() in ['integerConstant', 'stringConstant', 'keyword']:  # int,str,keyword
+        # unaryOp term nests a term per operator, written in a loop rather than by recursion
+        tk = self.tk
+        depth = 1
+        val = tk.token_val()
+        while val in UNARY_OP:
             self.write_elementary_expression_and_advance()
+            self.f.write("<term>\n")
+            depth += 1
+            val = tk.token_val()
+        token_type = tk.token_type()
+        if token_type == 'identifier':
+            # varName | varName '[' expression ']' | subroutineCall, told apart by the next token
+            rule = IDENTIFIER_TERMS.get(tk.peek_next_val(), '_term_var')
         else:
-            # varName
-            assert self.is_var_name()
-            name = self.tk.token_val()
-            kind = self.symbol_table.kind_of(name)
-            index = self.symbol_table.index_of(name)
-            self.write_identifier_and_advance(kind,'call',index)
+            rule = TERMS.get(val if token_type == 'symbol' else token_type)
+            if rule is None:
+                raise Exception('unexpected {} in expression'.format(val))
+        getattr(self, rule)()
+        self.f.write("</term>\n" * depth)
+
+    def _term_var(self):
+        assert self.is_var_name()
+        symbol = self.lookup_var(self.tk.token_val())
+        self.write_identifier_and_advance(symbol.kind, 'call', symbol.index)
 
-        self.f.write("</term>\n")
+    def _term_array(self):
+        assert self.is_var_name()
+        symbol = self.lookup_var(self.tk.token_val())
+        self.write_identifier_and_advance(symbol.kind, 'call', symbol.index)
+        self.write_elementary_expression_and_advance()  # '['
+        self.compile_expression()
+        assert self.tk.token_val() == ']'
+        self.write_elementary_expression_and_advance()
+
+    def _term_parenthesized(self):
+        self.write_elementary_expression_and_advance()
+        self.compile_expression()
+        assert self.tk.token_val() == ')'
+        self.write_elementary_expression_and_advance()
 
     def compile_expression_list(self):
         """
         Compiles a (possibly empty) comma-separated list of expressions.
         format: (expression (','expression)*)?
-        :return:
+        :return: n_expressions, int
         """
         self.f.write("<expressionList>\n")
+        n_expressions = 0
         if self.tk.token_val() != ')':  # expression list is not empty
             self.compile_expression()
+            n_expressions += 1
             while self.tk.token_val() == ',':
                 self.write_elementary_expression_and_advance()
                 self.compile_expression()
+                n_expressions += 1
         self.f.write("</expressionList>\n")
+        return n_expressions
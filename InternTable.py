@@ -0,0 +1,116 @@
+import sys
+"""
+Process-wide intern table of the lexical values of the compiler.
+Every distinct token text gets a small integer ID, and the table keeps one canonical string per ID.
+The tokenizers of all the files of a build store their token streams as arrays of IDs and decode them
+to the canonical strings only when a value is used, so names repeated across files
+(class names, method names, the OS identifiers) are allocated once, and the SymbolTable keys
+and the writers' values are the same objects, which dicts and == compare by identity first.
+The table holds every literal it was given, so long running processes bound it with reset_if_larger.
+"""
+
+# the OS API names every multi-class program repeats, shared from the start
+OS_NAMES = ['Math', 'String', 'Array', 'Output', 'Screen', 'Keyboard', 'Memory', 'Sys',
+            'init', 'abs', 'multiply', 'divide', 'min', 'max', 'sqrt', 'new', 'dispose', 'length',
+            'charAt', 'setCharAt', 'appendChar', 'eraseLastChar', 'intValue', 'setInt', 'backSpace',
+            'doubleQuote', 'newLine', 'moveCursor', 'printChar', 'printString', 'printInt', 'println',
+            'clearScreen', 'setColor', 'drawPixel', 'drawLine', 'drawRectangle', 'drawCircle',
+            'keyPressed', 'readChar', 'readLine', 'readInt', 'peek', 'poke', 'alloc', 'deAlloc',
+            'halt', 'error', 'wait']
+
+# entries kept by a long running process before its table is reset, about 2 MB with the caches
+MAX_ENTRIES = 16384
+
+
+class InternTable:
+    __slots__ = ('strings', 'types', 'values', '_ids', '_hits', '_preloaded')
+
+    def __init__(self, preload=()):
+        """
+        :param preload: iterable of strings interned up front
+        """
+        self.strings = []
+        # token type and value of each ID, filled lazily by JackTokenizer
+        self.types = {}
+        self.values = {}
+        self._ids = {}
+        self._hits = []
+        self._preloaded = []
+        self.preload(preload)
+
+    def preload(self, texts):
+        """
+        Interns texts up front, not counted as hits
+        :param texts: iterable of strings
+        """
+        for text in texts:
+            if text not in self._ids:
+                self.intern(text)
+                self._preloaded.append(text)
+
+    def reset(self):
+        """
+        Drops every entry but the preloaded ones, which keep their IDs.
+        The containers are replaced, not cleared: tokenizers created before keep the previous ones,
+        so their streams still decode.
+        """
+        self.strings = []
+        self.types = {}
+        self.values = {}
+        self._ids = {}
+        self._hits = []
+        preloaded, self._preloaded = self._preloaded, []
+        self.preload(preloaded)
+
+    def reset_if_larger(self, max_entries=MAX_ENTRIES):
+        """
+        Bounds the table of a long running process, e.g. a pool worker or a watch loop
+        :param max_entries: int
+        :return: boolean, True if the table was reset
+        """
+        if len(self.strings) <= max_entries:
+            return False
+        self.reset()
+        return True
+
+    def intern(self, text):
+        """
+        :param text: String
+        :return: int, the ID of text
+        """
+        i = self._ids.get(text)
+        if i is None:
+            i = len(self.strings)
+            self._ids[text] = i
+            self.strings.append(text)
+            self._hits.append(0)
+        else:
+            self._hits[i] += 1
+        return i
+
+    def text(self, i):
+        """
+        :param i: int, an ID returned by intern
+        :return: String, the canonical string of that ID
+        """
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def stats(self):
+        """
+        :return: dict, entries, interned lookups that found an existing entry,
+                 bytes of the duplicate strings that were not kept, and the size of the table
+        """
+        strings = self.strings
+        return {'entries': len(strings),
+                'hits': sum(self._hits),
+                # CPython caches single character strings already, they are not counted as saved
+                'saved_bytes': sum(hits * sys.getsizeof(strings[i]) for i, hits in enumerate(self._hits)
+                                   if hits and len(strings[i]) > 1),
+                'table_bytes': sys.getsizeof(strings) + sys.getsizeof(self._ids) +
+                sum(sys.getsizeof(text) for text in strings)}
+
+
+TABLE = InternTable(OS_NAMES)
@@ -1,7 +1,19 @@
 import JackTokenizer as Tk
 import CompilationEngine as CmpE
-from sys import argv
+import InternTable
+import MemoryProfile
+import VMCostModel
+import SignatureIndex
+import SplitCompiler
+import Stats
+import VMLinker
+import argparse
+import cProfile
+import contextlib
+import io
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 """
 The analyzer program operates on a given source, where source is either a file name of the form
 Xxx.jack or a directory name containing one or more such files.
@@ -11,24 +23,267 @@ For each source Xxx.jack, the analyzer goes through the following logic:
 3. Use the CompilationEngine to compile the input JackTokenizer into the output file.
 """
 
+WATCH_INTERVAL = 0.5
 
-def analyzer(file_path):
+
+def _no_phase(name):
+    return contextlib.nullcontext()
+
+
+def analyzer(file_path, split_pool=None, mem_profile=None, signatures=None):
+    """
+    Compiles a .jack file into Xxx.xml and Xxx.vm
+    :param file_path: String
+    :param split_pool: concurrent.futures.Executor, compile the subroutines of the class on it (see SplitCompiler),
+                       shared by the files of a build (None - compile the class in this process)
+    :param mem_profile: MemoryProfile.MemoryProfile, traces the phases of the file
+    :param signatures: dict, filled with the subroutine signatures of the class, keyed by full name
+    :return: JackTokenizer of the file
+    """
     input_file_path = file_path
     output_file_path = file_path[:-5] + ".xml"
     output_vm_path = file_path[:-5] + ".vm"
+    phase = _no_phase
+    if mem_profile is not None:
+        mem_profile.start_file(file_path, os.path.getsize(file_path))
+        phase = mem_profile.phase
+
+    with phase('tokenize'):
+        tk = Tk.JackTokenizer(input_file_path)
+    with phase('compile'):
+        if split_pool is not None:
+            xml, vm = SplitCompiler.compile_split(tk, pool=split_pool)
+            with open(output_file_path, 'w') as f:
+                f.write(xml)
+            with open(output_vm_path, 'w') as f:
+                f.write(vm)
+            if SignatureIndex.INDEX.path is not None:
+                SignatureIndex.INDEX.define_source(file_path, *SignatureIndex.scan(tk.token_str_list))
+        else:
+            with open(output_file_path, 'w') as f:
+                compiler = CmpE.CompilationEngine(tk, f, output_vm_path)
+                compiler.compile_class()
+                compiler.writer.close()
+            if signatures is not None:
+                signatures.update(compiler.subroutines)
+            if SignatureIndex.INDEX.path is not None:
+                # the index is filled from what the build compiled, the source is not read again
+                prefix = len(compiler.current_class) + 1
+                SignatureIndex.INDEX.define_source(file_path, compiler.current_class,
+                                                   {name[prefix:]: signature
+                                                    for name, signature in compiler.subroutines.items()})
+    return tk
+
+
+def compile_source(source):
+    """
+    Compiles the text of a single class in memory.
+    :param source: String, jack source of one class
+    :return: (xml, vm), Strings
+    """
+    InternTable.TABLE.reset_if_larger()
+    tk = Tk.JackTokenizer(source=source)
+    xml_out = io.StringIO()
+    vm_out = io.StringIO()
+    compiler = CmpE.CompilationEngine(tk, xml_out, vm_out)
+    compiler.compile_class()
+    return xml_out.getvalue(), vm_out.getvalue()
+
+
+def compile_sources(sources, workers=None, pool=None):
+    """
+    Compiles many classes without touching the filesystem.
+    Token strings are interned process wide, so names repeated across calls
+    (and across the classes of one call) are stored once, until the table of the process
+    grows over InternTable.MAX_ENTRIES and is reset.
+    :param sources: dict, name -> jack source text
+    :param workers: int, compile on a temporary pool of that many processes (None - in this process)
+    :param pool: concurrent.futures.Executor, reused across calls so the workers keep their
+                 intern tables warm. Takes precedence over workers
+    :return: dict, name -> (xml, vm)
+    """
+    names = list(sources)
+    texts = [sources[name] for name in names]
+    if pool is not None:
+        results = pool.map(compile_source, texts, chunksize=_chunksize(len(texts), getattr(pool, '_max_workers', 1)))
+    elif workers:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(compile_source, texts, chunksize=_chunksize(len(texts), workers)))
+    else:
+        results = map(compile_source, texts)
+    return dict(zip(names, results))
+
+
+def _chunksize(n_tasks, n_workers):
+    # a few chunks per worker amortizes the pickling round trips without starving the pool
+    return max(1, n_tasks // (n_workers * 4))
+
+
+def jack_files(dir_path):
+    """
+    lists the .jack files of a directory
+    :param dir_path: String
+    :return: list of file paths
+    """
+    return [dir_path + '/' + file for file in os.listdir(dir_path) if file[-5:] == '.jack']
+
+
+def watch(dir_path, interval=WATCH_INTERVAL, max_rebuilds=None):
+    """
+    Compiles a directory and then keeps polling it, recompiling only the .jack files
+    whose modification time changed since the last build.
+    :param dir_path: String
+    :param interval: float, seconds between polls
+    :param max_rebuilds: int, stop after that many rebuilds (None - run until interrupted)
+    :return: dict, file path -> mtime of the last build
+    """
+    mtimes = {}
+    rebuilds = 0
+    SignatureIndex.INDEX.forget_missing(dir_path)
+    try:
+        while max_rebuilds is None or rebuilds < max_rebuilds:
+            files = jack_files(dir_path)
+            changed = []
+            for file in files:
+                try:
+                    mtime = os.stat(file).st_mtime_ns
+                except FileNotFoundError:
+                    # deleted or renamed since the listing, e.g. by an editor saving it
+                    continue
+                if mtimes.get(file) != mtime:
+                    changed.append((file, mtime))
+            removed = [file for file in mtimes if file not in files]
+            for file in removed:
+                del mtimes[file]
+            if removed:
+                # calls to a deleted or renamed class are not checked against it any more
+                SignatureIndex.INDEX.invalidate(removed)
+                SignatureIndex.INDEX.save()
+
+            if changed:
+                start = time.perf_counter()
+                # every rebuild interns its classes again, the table does not grow with the edits
+                InternTable.TABLE.reset()
+                SignatureIndex.INDEX.invalidate([file for file, mtime in changed])
+                for file, mtime in changed:
+                    # keep watching after an error, the file is retried on its next change
+                    mtimes[file] = mtime
+                    try:
+                        analyzer(file)
+                    except Exception as e:
+                        print('error compiling {}: {!r}'.format(file, e))
+                SignatureIndex.INDEX.save()
+                elapsed = time.perf_counter() - start
+                rebuilds += 1
+                print('rebuilt {} of {} classes in {:.1f} ms'.format(len(changed), len(files),
+                                                                     elapsed * 1000))
+            else:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return mtimes
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Jack analyzer')
+    parser.add_argument('path', help='Xxx.jack file or a directory of .jack files')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and recompile changed classes of a directory')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL,
+                        help='seconds between polls in watch mode')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='compile a directory with the asyncio pipeline of AsyncAnalyzer')
+    parser.add_argument('--split', type=int, metavar='WORKERS',
+                        help='compile the subroutines of each class on a pool of WORKERS processes')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write per-phase timings and counters, per file and aggregated, as JSON')
+    parser.add_argument('--profile', metavar='FILE', help='dump a cProfile of the run')
+    parser.add_argument('--mem-profile', metavar='FILE',
+                        help='trace the memory of each phase with tracemalloc, report it and save it as JSON')
+    parser.add_argument('--cost', choices=['table', 'json'],
+                        help='print the static cost report of the generated VM functions')
+    parser.add_argument('--cost-budget', type=int, metavar='HACK_INSTRUCTIONS',
+                        help='fail when a function is estimated above that many Hack instructions')
+    parser.add_argument('--link', action='store_true',
+                        help='link the classes of a directory into <dir>/<dir>.linked.vm and a <dir>/<dir>.vmimg image, '
+                             'checking the arguments of every call')
+    parser.add_argument('--signatures', metavar='FILE',
+                        help='index of the subroutine signatures of the classes compiled with it, kept across '
+                             'builds and projects, used to check and dispatch the calls to other classes')
+    parser.add_argument('--intern-stats', action='store_true',
+                        help='print the size and the savings of the shared intern table after the build')
+    args = parser.parse_args(args)
+
+    path = args.path.rstrip('/')
+    if args.signatures:
+        SignatureIndex.INDEX = SignatureIndex.SignatureIndex(args.signatures)
+    if path[-5:] != '.jack':
+        assert not (args.watch or args.use_async) or \
+            not (args.stats or args.profile or args.mem_profile or args.cost or args.cost_budget is not None), \
+            '--stats, --profile, --mem-profile and --cost report on a single build'
+        assert not (args.link and (args.watch or args.use_async or args.split)), \
+            '--link needs the signatures of a serial build'
+        if args.watch:
+            watch(path, args.interval)
+            return
+        elif args.use_async:
+            import AsyncAnalyzer
+            AsyncAnalyzer.analyze(path)
+            return
+        files = jack_files(path)
+    else:
+        assert not args.watch, 'watch mode expects a directory'
+        assert not args.link, '--link expects a directory'
+        files = [path]
+
+    stats = Stats.Stats() if args.stats else None
+    profiler = cProfile.Profile() if args.profile else None
+    mem_profile = MemoryProfile.MemoryProfile() if args.mem_profile else None
+    signatures = {} if args.link else None
+    if args.signatures:
+        SignatureIndex.INDEX.invalidate(files)
+        if path[-5:] != '.jack':
+            SignatureIndex.INDEX.forget_missing(path)
+    # one pool for the whole build, its startup is not paid again for every class
+    split_pool = ProcessPoolExecutor(args.split) if args.split else None
+    with stats or contextlib.nullcontext(), profiler or contextlib.nullcontext(), \
+            mem_profile or contextlib.nullcontext(), split_pool or contextlib.nullcontext():
+        for file in files:
+            if stats is not None:
+                stats.start_file(file)
+            analyzer(file, split_pool, mem_profile, signatures)
+    SignatureIndex.INDEX.save()
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+    if stats is not None:
+        stats.save(args.stats)
+    if mem_profile is not None:
+        mem_profile.save(args.mem_profile)
+        print(mem_profile.report())
+
+    if args.intern_stats:
+        stats = InternTable.TABLE.stats()
+        print('intern table: {entries} entries, {table_bytes} bytes, {hits} repeated values, '
+              '{saved_bytes} bytes of duplicate strings not kept'.format(**stats))
+
+    if args.link:
+        try:
+            VMLinker.link_directory(path, [file[:-5] + '.vm' for file in files], signatures)
+        except VMLinker.LinkError as e:
+            raise SystemExit('link failed:\n{}'.format(e))
+
+    if args.cost or args.cost_budget is not None:
+        functions = VMCostModel.analyze_files([file[:-5] + '.vm' for file in files])
+        if args.cost == 'json':
+            print(VMCostModel.to_json(functions))
+        elif args.cost == 'table':
+            print(VMCostModel.format_table(functions))
+        if args.cost_budget is not None:
+            over = VMCostModel.over_budget(functions, args.cost_budget)
+            if over:
+                raise SystemExit('over the budget of {} Hack instructions: {}'.format(args.cost_budget,
+                                                                                      ', '.join(over)))
+
 
-    tk = Tk.JackTokenizer(input_file_path)
-    with open(output_file_path, 'w') as f:
-        compiler = CmpE.CompilationEngine(tk, f, output_vm_path)
-        compiler.compile_class()
-    return
-
-
-assert len(argv) == 2, 'path argument expected'
-if argv[1][-5:] != '.jack':
-    dirs = os.listdir(argv[1])
-    for file in dirs:
-        if file[-5:] == '.jack':
-            analyzer(argv[1] + '/' + file)
-else:
-    analyzer(argv[1])
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 from logging import info, debug
+from array import array
+from InternTable import TABLE
 
 SYMBOLS = ['{', '}', "(", ")", "[", "]", ".", ",", ";",
            "+", "-", "*", "/", "&", "|", "<", ">", "=", "~"]
@@ -9,27 +11,73 @@ SPECIAL_SYMBOLS = {
 KEYWORDS = ['class', 'constructor', 'function', 'method', 'field', 'static',
             'var', 'int', 'char', 'boolean', 'void', 'true', 'false', 'null', 'this',
             'let', 'do', 'if', 'else', 'while', 'return']
+TABLE.preload(KEYWORDS + SYMBOLS)
 
 
 class JackTokenizer:
 
-    def __init__(self, input_file_path):
+    def __init__(self, input_file_path=None, source=None):
         """
         Opens the input file/stream and gets ready to tokenize it.
-        :param input_file_path:
+        :param input_file_path: String, path of a .jack file
+        :param source: String, jack source text, used instead of reading input_file_path
         """
-        with open(input_file_path, 'r') as f:
-            content = f.readlines()
+        if source is None:
+            with open(input_file_path, 'r') as f:
+                content = f.readlines()
+        else:
+            content = source.splitlines(True)
 
         clean_lines = self._clean_whitespace(content)
-        self.token_str_list = self._tokens_str_from_clean_lines(clean_lines)
+        intern = TABLE.intern
+        self.token_ids = array('I', [intern(token) for token in self._tokens_str_from_clean_lines(clean_lines)])
+        self._strings = TABLE.strings
+        # type and value of every token text, keyed by ID. Both only depend on the text,
+        # so each distinct token is classified once per table
+        self._types = TABLE.types
+        self._values = TABLE.values
         self._index = None
-        self._max_index = len(self.token_str_list) - 1
+        self._max_index = len(self.token_ids) - 1
+
+    @classmethod
+    def from_token_ids(cls, token_ids):
+        """
+        Creates a tokenizer over an already tokenized stream, e.g. a slice of another tokenizer's tokens.
+        :param token_ids: array of intern table IDs
+        :return: JackTokenizer
+        """
+        tk = cls.__new__(cls)
+        tk.token_ids = token_ids
+        tk._strings = TABLE.strings
+        tk._types = TABLE.types
+        tk._values = TABLE.values
+        tk._index = None
+        tk._max_index = len(token_ids) - 1
+        return tk
+
+    @classmethod
+    def from_tokens(cls, token_str_list):
+        """
+        Like from_token_ids, for a stream of token strings (e.g. received from another process)
+        :param token_str_list: list of strings that represent tokens
+        :return: JackTokenizer
+        """
+        intern = TABLE.intern
+        return cls.from_token_ids(array('I', [intern(token) for token in token_str_list]))
+
+    @property
+    def token_str_list(self):
+        """
+        The token stream decoded to strings
+        :return: list of strings
+        """
+        strings = self._strings
+        return [strings[i] for i in self.token_ids]
 
     @property
     def current_token(self):
         assert self._index is not None, "error, invalid token index"
-        return self.token_str_list[self._index]
+        return self._strings[self.token_ids[self._index]]
 
     @staticmethod
     def _tokens_str_from_clean_lines(clean_lines):
@@ -123,7 +171,7 @@ class JackTokenizer:
         Do we have more tokens in the input?
         :return: boolean
         """
-        if len(self.token_str_list) == 0:
+        if len(self.token_ids) == 0:
             return False
         return self._index != self._max_index
 
@@ -158,6 +206,14 @@ class JackTokenizer:
         Returns the type of the current token
         :return: TOKEN_TYPE : keyword, symbol, identifier, integerConstant, stringConstant
         """
+        assert self._index is not None, "error, invalid token index"
+        token_id = self.token_ids[self._index]
+        token_type = self._types.get(token_id)
+        if token_type is None:
+            token_type = self._types[token_id] = self._classify()
+        return token_type
+
+    def _classify(self):
         if self.current_token in SYMBOLS:
             return "symbol"
         elif self.current_token in KEYWORDS:
@@ -179,6 +235,14 @@ class JackTokenizer:
         gets value of current_token
         :return:
         """
+        assert self._index is not None, "error, invalid token index"
+        token_id = self.token_ids[self._index]
+        value = self._values.get(token_id)
+        if value is None:
+            value = self._values[token_id] = self._value()
+        return value
+
+    def _value(self):
         token_type = self.token_type()
 
         if token_type == "keyword":
@@ -0,0 +1,88 @@
+import contextlib
+import json
+import tracemalloc
+"""
+tracemalloc based memory profiling of the analyzer phases.
+Each phase is wrapped by two snapshots, which give the memory it retained and the source lines
+that allocated it, and by a peak reset, which gives the most memory alive at once during the phase.
+"""
+
+TOP_SITES = 10
+_IGNORED = [tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, __file__)]
+
+
+class MemoryProfile:
+    def __init__(self, top=TOP_SITES):
+        """
+        :param top: int, number of allocation sites reported per phase
+        """
+        self.top = top
+        self.files = {}
+        self.peak = 0
+        self._current = None
+
+    def __enter__(self):
+        tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        return False
+
+    def start_file(self, file_path, source_bytes):
+        """
+        Makes the following phases count for file_path
+        :param file_path: String
+        :param source_bytes: int, size of the source file
+        :return:
+        """
+        self._current = self.files.setdefault(file_path, {'source_bytes': source_bytes, 'phases': {}})
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Profiles the memory of the enclosed block
+        :param name: String
+        """
+        before = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        start_size, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        tracemalloc.reset_peak()
+        yield
+        end_size, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        after = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+        sites = []
+        for stat in after.compare_to(before, 'lineno')[:self.top]:
+            frame = stat.traceback[0]
+            sites.append({'site': '{}:{}'.format(frame.filename, frame.lineno),
+                          'size_diff': stat.size_diff,
+                          'count_diff': stat.count_diff})
+        self._current['phases'][name] = {'peak': peak - start_size,
+                                         'retained': end_size - start_size,
+                                         'top': sites}
+
+    def as_dict(self):
+        return {'peak': self.peak, 'files': self.files}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+    def report(self):
+        """
+        :return: String, human readable summary
+        """
+        lines = ['peak traced memory: {} bytes'.format(self.peak)]
+        for file_path, record in self.files.items():
+            lines.append('{} ({} source bytes)'.format(file_path, record['source_bytes']))
+            for name, phase in record['phases'].items():
+                lines.append('  {:<10} peak {:>10}  retained {:>10}'.format(name, phase['peak'], phase['retained']))
+                for site in phase['top'][:3]:
+                    lines.append('    {:>+10}  {}'.format(site['size_diff'], site['site']))
+        return '\n'.join(lines)
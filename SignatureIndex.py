@@ -0,0 +1,280 @@
+import os
+import struct
+from collections import namedtuple
+"""
+Index of the subroutine signatures calls are resolved against: kind, return type and number of
+parameters, keyed by class and subroutine name.
+It always knows the Jack OS API. Given a file, it also keeps every class indexed by earlier builds,
+across projects: the file is only read on the first lookup, and only written back when a build
+changed it. A build first invalidates the classes whose sources changed or were deleted since they
+were indexed, then records the signatures of each class it compiles, so no source is read twice
+for the index.
+"""
+
+MAGIC = b'JSIG'
+VERSION = 1
+KINDS = ['constructor', 'function', 'method']
+SUBROUTINE_KINDS = frozenset(KINDS)
+
+
+class Signature(namedtuple('Signature', ['kind', 'type', 'n_params'])):
+    __slots__ = ()
+
+
+# an indexed class: the source it was scanned from and its subroutines
+_Entry = namedtuple('_Entry', ['path', 'mtime', 'size', 'signatures'])
+
+
+def _os_class(*declarations):
+    signatures = {}
+    for declaration in declarations:
+        kind, ret_type, name, n_params = declaration.split()
+        signatures[name] = Signature(kind, ret_type, int(n_params))
+    return signatures
+
+
+OS_API = {
+    'Math': _os_class('function void init 0', 'function int abs 1', 'function int multiply 2',
+                      'function int divide 2', 'function int min 2', 'function int max 2', 'function int sqrt 1'),
+    'String': _os_class('constructor String new 1', 'method void dispose 0', 'method int length 0',
+                        'method char charAt 1', 'method void setCharAt 2', 'method String appendChar 1',
+                        'method void eraseLastChar 0', 'method int intValue 0', 'method void setInt 1',
+                        'function char backSpace 0', 'function char doubleQuote 0', 'function char newLine 0'),
+    'Array': _os_class('function Array new 1', 'method void dispose 0'),
+    'Output': _os_class('function void init 0', 'function void moveCursor 2', 'function void printChar 1',
+                        'function void printString 1', 'function void printInt 1', 'function void println 0',
+                        'function void backSpace 0'),
+    'Screen': _os_class('function void init 0', 'function void clearScreen 0', 'function void setColor 1',
+                        'function void drawPixel 2', 'function void drawLine 4', 'function void drawRectangle 4',
+                        'function void drawCircle 3'),
+    'Keyboard': _os_class('function void init 0', 'function char keyPressed 0', 'function char readChar 0',
+                          'function String readLine 1', 'function int readInt 1'),
+    'Memory': _os_class('function void init 0', 'function int peek 1', 'function void poke 2',
+                        'function Array alloc 1', 'function void deAlloc 1'),
+    'Sys': _os_class('function void init 0', 'function void halt 0', 'function void error 1',
+                     'function void wait 1'),
+}
+
+
+def scan(tokens):
+    """
+    Reads the subroutine declarations of a class without compiling it
+    :param tokens: list of strings, the tokens of one class
+    :return: (class name, dict, subroutine name -> Signature)
+    """
+    signatures = {}
+    depth = 0
+    i = 0
+    n_tokens = len(tokens)
+    while i < n_tokens:
+        token = tokens[i]
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+        elif depth == 1 and token in SUBROUTINE_KINDS:
+            ret_type, name = tokens[i + 1], tokens[i + 2]
+            assert tokens[i + 3] == '(', 'expected "("'
+            i += 4
+            n_params = 0
+            if tokens[i] != ')':
+                n_params = 1
+                while tokens[i] != ')':
+                    if tokens[i] == ',':
+                        n_params += 1
+                    i += 1
+            signatures[name] = Signature(token, ret_type, n_params)
+        i += 1
+    return tokens[1], signatures
+
+
+def _pack_str(text):
+    data = text.encode()
+    return struct.pack('<H', len(data)) + data
+
+
+def _unpack_str(data, offset):
+    (length,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    return data[offset:offset + length].decode(), offset + length
+
+
+class SignatureIndex:
+    def __init__(self, path=None, classes=None):
+        """
+        :param path: String, file the index is loaded from and saved to (None - kept in memory only)
+        :param classes: dict, class name -> dict of Signatures, known up front (e.g. from referenced())
+        """
+        self.path = path
+        self._classes = None
+        self._initial = classes or {}
+        self._dirty = False
+
+    def _load(self):
+        """
+        Reads the index file, once. A missing, older or unreadable file starts an empty index.
+        :return: dict, class name -> _Entry
+        """
+        classes = {}
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            try:
+                classes = self._decode(data)
+            except (struct.error, UnicodeDecodeError, IndexError):
+                classes = {}
+        for class_name, signatures in self._initial.items():
+            classes[class_name] = _Entry('', 0, 0, signatures)
+        self._classes = classes
+        return classes
+
+    @staticmethod
+    def _decode(data):
+        if data[:4] != MAGIC or struct.unpack_from('<H', data, 4)[0] != VERSION:
+            return {}
+        (n_classes,) = struct.unpack_from('<H', data, 6)
+        offset = 8
+        classes = {}
+        for _ in range(n_classes):
+            class_name, offset = _unpack_str(data, offset)
+            path, offset = _unpack_str(data, offset)
+            mtime, size, n_subroutines = struct.unpack_from('<QIH', data, offset)
+            offset += 14
+            signatures = {}
+            for _ in range(n_subroutines):
+                kind, n_params = struct.unpack_from('<BB', data, offset)
+                name, offset = _unpack_str(data, offset + 2)
+                ret_type, offset = _unpack_str(data, offset)
+                signatures[name] = Signature(KINDS[kind], ret_type, n_params)
+            classes[class_name] = _Entry(path, mtime, size, signatures)
+        return classes
+
+    def _encode(self):
+        entries = [(class_name, entry) for class_name, entry in self._classes.items() if entry.path]
+        parts = [MAGIC, struct.pack('<HH', VERSION, len(entries))]
+        for class_name, entry in entries:
+            parts.append(_pack_str(class_name))
+            parts.append(_pack_str(entry.path))
+            parts.append(struct.pack('<QIH', entry.mtime, entry.size, len(entry.signatures)))
+            for name, signature in entry.signatures.items():
+                parts.append(struct.pack('<BB', KINDS.index(signature.kind), signature.n_params))
+                parts.append(_pack_str(name))
+                parts.append(_pack_str(signature.type))
+        return b''.join(parts)
+
+    def lookup(self, class_name, subroutine):
+        """
+        :param class_name: String
+        :param subroutine: String
+        :return: Signature, or None if the subroutine is not known
+        """
+        classes = self._classes if self._classes is not None else self._load()
+        entry = classes.get(class_name)
+        signatures = entry.signatures if entry is not None else OS_API.get(class_name)
+        if signatures is None:
+            return None
+        return signatures.get(subroutine)
+
+    def __contains__(self, class_name):
+        classes = self._classes if self._classes is not None else self._load()
+        return class_name in classes or class_name in OS_API
+
+    def define(self, class_name, signatures, path='', mtime=0, size=0):
+        """
+        Adds or replaces the signatures of a class
+        :param class_name: String
+        :param signatures: dict, subroutine name -> Signature
+        :param path: String, source of the class, the class is saved to the file only if it has one
+        :param mtime: int, modification time of the source in ns
+        :param size: int, size of the source in bytes
+        """
+        classes = self._classes if self._classes is not None else self._load()
+        entry = _Entry(path, mtime, size, signatures)
+        if classes.get(class_name) != entry:
+            classes[class_name] = entry
+            if path:
+                self._dirty = True
+
+    def define_source(self, path, class_name, signatures):
+        """
+        Records the signatures a build read from a .jack file, with the file's modification time and size
+        :param path: String
+        :param class_name: String
+        :param signatures: dict, subroutine name -> Signature
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self.define(class_name, signatures, path, stat.st_mtime_ns, stat.st_size)
+
+    def invalidate(self, paths):
+        """
+        Forgets the classes whose source changed since they were indexed, before a build compiles them,
+        so no call is checked against a stale signature. Only the files are stat'ed, the build that
+        compiles them defines them again. A path that no longer exists forgets the class indexed from it.
+        :param paths: list of .jack file paths
+        :return: list of the names of the classes forgotten
+        """
+        classes = self._classes if self._classes is not None else self._load()
+        forgotten = []
+        for path in paths:
+            class_name = os.path.basename(path)[:-5]
+            entry = classes.get(class_name)
+            if entry is None:
+                continue
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None:
+                # deleted or renamed, nothing defines the class again: forget it if it came from this file
+                stale = entry.path == path
+            else:
+                stale = (entry.path, entry.mtime, entry.size) != (path, stat.st_mtime_ns, stat.st_size)
+            if stale:
+                del classes[class_name]
+                self._dirty = True
+                forgotten.append(class_name)
+        return forgotten
+
+    def forget_missing(self, dir_path):
+        """
+        Forgets the classes indexed from the .jack files of a directory that no longer exist,
+        deleted or renamed since they were indexed
+        :param dir_path: String
+        :return: list of the names of the classes forgotten
+        """
+        classes = self._classes if self._classes is not None else self._load()
+        dir_path = os.path.abspath(dir_path)
+        forgotten = [class_name for class_name, entry in classes.items()
+                     if entry.path and os.path.dirname(entry.path) == dir_path and not os.path.exists(entry.path)]
+        for class_name in forgotten:
+            del classes[class_name]
+        if forgotten:
+            self._dirty = True
+        return forgotten
+
+    def referenced(self, tokens):
+        """
+        :param tokens: list of strings, the tokens of one class
+        :return: dict, class name -> dict of Signatures, of the indexed classes besides the OS the tokens name,
+                 to resolve the calls of that class the same way in another process
+        """
+        classes = self._classes if self._classes is not None else self._load()
+        return {name: classes[name].signatures for name in set(tokens) if name in classes}
+
+    def save(self):
+        """
+        Writes the index to its file, if it changed since it was loaded
+        """
+        if self.path is None or not self._dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._encode())
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+# the index the compilation engines use, OS only until given a file (see JackAnalyzer --signatures)
+INDEX = SignatureIndex()
@@ -0,0 +1,102 @@
+import JackTokenizer as Tk
+import CompilationEngine as CmpE
+import SignatureIndex
+import io
+from concurrent.futures import ProcessPoolExecutor
+"""
+Intra-file parallelism for classes with many subroutines.
+The class is tokenized once and split at subroutine boundaries. The class header and the
+classVarDecs are compiled first, filling the class scope of the SymbolTable. Every subroutine
+then only needs its own tokens, a snapshot of the class scope and a fresh subroutine scope,
+so the subroutines are compiled on a process pool and their XML/VM fragments are stitched
+back together in source order. Each task also carries the signatures of the class and, when it
+goes to another process, those of the indexed classes the class names, so its calls resolve
+exactly as in a serial build.
+"""
+
+SUBROUTINE_KEYWORDS = frozenset(['constructor', 'function', 'method'])
+CLASS_TAIL = "<symbol> } </symbol>\n</class>\n"
+
+
+def subroutine_boundaries(tokens):
+    """
+    Finds the subroutine declarations of a class.
+    :param tokens: list of strings, the tokens of one class
+    :return: (spans, end): spans - list of (start, stop) token slices, one per subroutine,
+             end - index of the closing '}' of the class
+    """
+    spans = []
+    depth = 0
+    start = None
+    for i, token in enumerate(tokens):
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 1 and start is not None:
+                spans.append((start, i + 1))
+                start = None
+            elif depth == 0:
+                return spans, i
+        elif depth == 1 and start is None and token in SUBROUTINE_KEYWORDS:
+            start = i
+    raise Exception("expected '}' closing the class")
+
+
+def _compile_subroutine(task):
+    class_name, class_scope, class_signatures, indexed, tokens = task
+    xml_out = io.StringIO()
+    vm_out = io.StringIO()
+    index = SignatureIndex.SignatureIndex(classes=indexed) if indexed is not None else None
+    compiler = CmpE.CompilationEngine(Tk.JackTokenizer.from_tokens(tokens), xml_out, vm_out, index)
+    compiler.current_class = class_name
+    compiler.class_signatures = class_signatures
+    compiler.symbol_table.load_class_scope(class_scope)
+    compiler.tk.advance()
+    compiler.compile_subroutine()
+    return xml_out.getvalue(), vm_out.getvalue()
+
+
+def compile_split(tk, workers=None, pool=None):
+    """
+    Compiles a class, one subroutine per task.
+    :param tk: JackTokenizer of the class
+    :param workers: int, size of a temporary process pool (None - compile in this process)
+    :param pool: concurrent.futures.Executor to use instead of a temporary pool, e.g. one shared by a build
+    :return: (xml, vm), Strings identical to what CompilationEngine.compile_class writes
+    """
+    tokens = tk.token_str_list
+    spans, end = subroutine_boundaries(tokens)
+    header_end = spans[0][0] if spans else end
+    class_signatures = SignatureIndex.scan(tokens)[1]
+
+    xml_out = io.StringIO()
+    vm_out = io.StringIO()
+    compiler = CmpE.CompilationEngine(Tk.JackTokenizer.from_tokens(tokens[:header_end] + tokens[end:end + 1]),
+                                      xml_out, vm_out)
+    compiler.class_signatures = class_signatures
+    compiler.compile_class()
+    header_xml = xml_out.getvalue()
+    assert header_xml.endswith(CLASS_TAIL)
+
+    class_scope = compiler.symbol_table.class_scope()
+    # the process compiling in place shares SignatureIndex.INDEX, workers only get the classes referenced
+    indexed = SignatureIndex.INDEX.referenced(tokens) if pool is not None or workers else None
+    tasks = [(compiler.current_class, class_scope, class_signatures, indexed, tokens[start:stop])
+             for start, stop in spans]
+    if pool is not None:
+        fragments = list(pool.map(_compile_subroutine, tasks,
+                                  chunksize=max(1, len(tasks) // (getattr(pool, '_max_workers', 1) * 4))))
+    elif workers:
+        with ProcessPoolExecutor(workers) as pool:
+            fragments = list(pool.map(_compile_subroutine, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        fragments = [_compile_subroutine(task) for task in tasks]
+
+    xml = [header_xml[:-len(CLASS_TAIL)]]
+    vm = [vm_out.getvalue()]
+    for sub_xml, sub_vm in fragments:
+        xml.append(sub_xml)
+        vm.append(sub_vm)
+    xml.append(CLASS_TAIL)
+    return ''.join(xml), ''.join(vm)
@@ -0,0 +1,174 @@
+import JackTokenizer as Tk
+import CompilationEngine as CmpE
+import SymbolTable
+import VMWriter
+import functools
+import json
+import time
+from collections import Counter
+"""
+Opt-in instrumentation of the compiler.
+While a Stats object is active (with stats: ...) the methods of JackTokenizer, CompilationEngine,
+SymbolTable and VMWriter are replaced by counting/timing wrappers, and the originals are put back
+when it exits. Nothing is patched otherwise, so a run without stats pays nothing.
+Only the current process is observed, subroutines compiled on a worker pool are not counted.
+"""
+
+PHASES = ['tokenize', 'parse', 'xml_write', 'vm_write', 'total']
+SYMBOL_TABLE_PROBES = ['lookup', 'is_in_table', 'kind_of', 'type_of', 'index_of', 'define']
+VM_COMMANDS = ['write_push', 'write_pop', 'write_arithmetic', 'write_label', 'write_goto', 'write_if',
+               'write_call', 'write_function', 'write_return']
+
+
+def _new_record():
+    return {'phases': dict.fromkeys(PHASES, 0.0),
+            'tokens': Counter(),
+            'compile_calls': Counter(),
+            'symbol_table': Counter(),
+            'xml': Counter(),
+            'vm': Counter()}
+
+
+class _CountingStream:
+    """
+    Wraps an output stream, counting the bytes and calls written,
+    and the time spent writing when a phase is given
+    """
+    def __init__(self, stream, counter, stats, phase):
+        self._stream = stream
+        self._counter = counter
+        self._stats = stats
+        self._phase = phase
+
+    def write(self, text):
+        if self._phase is None:
+            n = self._stream.write(text)
+        else:
+            start = time.perf_counter()
+            n = self._stream.write(text)
+            self._stats.current['phases'][self._phase] += time.perf_counter() - start
+        self._counter['bytes'] += len(text)
+        self._counter['writes'] += 1
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class Stats:
+    def __init__(self):
+        self.files = {}
+        self.current = _new_record()
+        self._originals = []
+
+    def start_file(self, file_path):
+        """
+        Makes the following measurements count for file_path
+        :param file_path: String
+        :return:
+        """
+        self.current = self.files.setdefault(file_path, _new_record())
+
+    def __enter__(self):
+        self._install()
+        return self
+
+    def __exit__(self, *exc):
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+        return False
+
+    def _patch(self, cls, name, make_wrapper):
+        original = cls.__dict__[name]
+        self._originals.append((cls, name, original))
+        setattr(cls, name, functools.wraps(original)(make_wrapper(original)))
+
+    def _install(self):
+        stats = self
+
+        def tokenizer_init(original):
+            def wrapper(tk, *args, **kwargs):
+                start = time.perf_counter()
+                original(tk, *args, **kwargs)
+                stats.current['phases']['tokenize'] += time.perf_counter() - start
+                counts = stats.current['tokens']
+                probe = Tk.JackTokenizer.from_token_ids(tk.token_ids)
+                for _ in tk.token_ids:
+                    probe.advance()
+                    # classified without the tokenizer's cache, which the build must warm inside its own phases
+                    counts[probe._classify()] += 1
+            return wrapper
+        self._patch(Tk.JackTokenizer, '__init__', tokenizer_init)
+
+        def engine_init(original):
+            def wrapper(engine, input_file, output_file, output_vm_path, *args):
+                original(engine, input_file, _CountingStream(output_file, stats.current['xml'], stats, 'xml_write'),
+                         output_vm_path, *args)
+                engine.writer.f = _CountingStream(engine.writer.f, stats.current['vm'], stats, None)
+            return wrapper
+        self._patch(CmpE.CompilationEngine, '__init__', engine_init)
+
+        def compile_class(original):
+            def wrapper(engine):
+                phases = stats.current['phases']
+                writing = phases['xml_write'] + phases['vm_write']
+                start = time.perf_counter()
+                original(engine)
+                elapsed = time.perf_counter() - start
+                stats.current['compile_calls']['compile_class'] += 1
+                phases['parse'] += elapsed - (phases['xml_write'] + phases['vm_write'] - writing)
+            return wrapper
+        self._patch(CmpE.CompilationEngine, 'compile_class', compile_class)
+
+        def counted(counter, key):
+            def make_wrapper(original):
+                def wrapper(*args, **kwargs):
+                    stats.current[counter][key] += 1
+                    return original(*args, **kwargs)
+                return wrapper
+            return make_wrapper
+
+        for name in list(vars(CmpE.CompilationEngine)):
+            if name.startswith('compile_') and name != 'compile_class':
+                self._patch(CmpE.CompilationEngine, name, counted('compile_calls', name))
+        for name in SYMBOL_TABLE_PROBES:
+            self._patch(SymbolTable.SymbolTable, name, counted('symbol_table', name))
+
+        def vm_command(original):
+            # formatting included, so vm_write is the whole cost of the VMWriter
+            def wrapper(*args):
+                start = time.perf_counter()
+                original(*args)
+                record = stats.current
+                record['phases']['vm_write'] += time.perf_counter() - start
+                record['vm']['commands'] += 1
+            return wrapper
+
+        for name in VM_COMMANDS:
+            self._patch(VMWriter.VMWriter, name, vm_command)
+
+    def total(self):
+        """
+        Aggregates the records of all the files
+        :return: dict
+        """
+        total = _new_record()
+        for record in self.files.values():
+            for key, value in record.items():
+                if key == 'phases':
+                    for phase, seconds in value.items():
+                        total['phases'][phase] += seconds
+                else:
+                    total[key].update(value)
+        return total
+
+    def as_dict(self):
+        for record in self.files.values():
+            phases = record['phases']
+            phases['total'] = phases['tokenize'] + phases['parse'] + phases['xml_write'] + phases['vm_write']
+        return {'files': self.files, 'total': self.total()}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
@@ -1,23 +1,52 @@
+from collections import namedtuple
+
+SEGMENTS = {'STATIC': 'static',
+            'FIELD': 'this',
+            'ARG': 'argument',
+            'VAR': 'local'}
+CLASS_KINDS = ('STATIC', 'FIELD')
+SUBROUTINE_KINDS = ('ARG', 'VAR')
+
+
+class Symbol(namedtuple('Symbol', ['type', 'kind', 'index', 'segment'])):
+    """
+    One entry of the symbol table, segment is the VM segment the identifier lives in
+    """
+    __slots__ = ()
+
+
 class SymbolTable:
+    __slots__ = ('_symbols', '_shadowed', '_by_kind')
+
     def __init__(self):
         """
         Creates a new empty symbol table
+        All the visible names share one dict, so a lookup is a single probe. Subroutine names
+        are chained over the class scope: a class entry hidden by an ARG/VAR of the same name
+        is kept aside and restored when the subroutine scope ends.
         """
-        self.subroutine_table = {}
-        self.class_table = {}
-        self.index_table = {'STATIC': 0,
-                            'FIELD': 0,
-                            'ARG': 0,
-                            'VAR': 0}
+        self._symbols = {}
+        self._shadowed = {}
+        self._by_kind = {'STATIC': [],
+                         'FIELD': [],
+                         'ARG': [],
+                         'VAR': []}
 
     def start_subroutine(self):
         """
         Starts a new subroutine scope (i.e. erases all names in the previous subroutine's scope.)
+        The scope containers are cleared in place, nothing is allocated.
         :return:
         """
-        self.subroutine_table = {}
-        self.index_table['VAR'] = 0
-        self.index_table['ARG'] = 0
+        symbols = self._symbols
+        for kind in SUBROUTINE_KINDS:
+            names = self._by_kind[kind]
+            for name in names:
+                symbols.pop(name, None)
+            names.clear()
+        if self._shadowed:
+            symbols.update(self._shadowed)
+            self._shadowed.clear()
 
     def define(self, name, o_type, kind):
         """
@@ -28,23 +57,51 @@ class SymbolTable:
         :param name: String
         :param o_type: String
         :param kind: STATIC, FIELD, ARG, VAR
-        :return:
+        :return: Symbol, the new entry
         """
+        names = self._by_kind.get(kind)
+        if names is None:
+            raise Exception('invalid kind')
 
-        index = self.var_count(kind)
+        if kind in SUBROUTINE_KINDS:
+            previous = self._symbols.get(name)
+            if previous is not None and previous.kind in CLASS_KINDS:
+                self._shadowed[name] = previous
 
-        if (kind == 'FIELD') | (kind == 'STATIC'):
-            self.class_table[name] = {'type': o_type,
-                                      'kind': kind,
-                                      'index': index}
-        elif (kind == 'ARG') | (kind == 'VAR'):
-            self.subroutine_table[name] = {'type': o_type,
-                                           'kind': kind,
-                                           'index': index}
-        else:
-            raise Exception('invalid kind')
+        symbol = Symbol(o_type, kind, len(names), SEGMENTS[kind])
+        self._symbols[name] = symbol
+        names.append(name)
+        return symbol
+
+    def lookup(self, name):
+        """
+        Returns the whole entry of the named identifier in the current scope
+        :param name: String
+        :return: Symbol, None if the identifier is not defined
+        """
+        return self._symbols.get(name)
+
+    def class_scope(self):
+        """
+        Returns a snapshot of the class scope, to be loaded into another table with load_class_scope
+        :return: list of (name, Symbol)
+        """
+        scope = []
+        for kind in CLASS_KINDS:
+            for name in self._by_kind[kind]:
+                symbol = self._shadowed.get(name) or self._symbols[name]
+                scope.append((name, symbol))
+        return scope
 
-        self.index_table[kind] += 1
+    def load_class_scope(self, scope):
+        """
+        Defines the class scope from a snapshot taken by class_scope
+        :param scope: list of (name, Symbol)
+        :return:
+        """
+        for name, symbol in scope:
+            self._symbols[name] = symbol
+            self._by_kind[symbol.kind].append(name)
 
     def var_count(self, kind):
         """
@@ -54,15 +111,16 @@ class SymbolTable:
         :return: int
         """
 
-        return self.index_table[kind]
+        return len(self._by_kind[kind])
 
     def is_in_table(self, name):
-        if name in self.subroutine_table:
-            return True
-        elif name in self.class_table:
-            return True
-        else:
-            return False
+        return name in self._symbols
+
+    def _entry(self, name):
+        symbol = self._symbols.get(name)
+        if symbol is None:
+            raise Exception('identifier not found')
+        return symbol
 
     def kind_of(self, name):
         """
@@ -70,12 +128,7 @@ class SymbolTable:
         :param name: String
         :return: String
         """
-        if name in self.subroutine_table:
-            return self.subroutine_table[name]['kind']
-        elif name in self.class_table:
-            return self.class_table[name]['kind']
-        else:
-            raise Exception('identifier not found')
+        return self._entry(name).kind
 
     def type_of(self, name):
         """
@@ -83,12 +136,7 @@ class SymbolTable:
         :param name: String
         :return: String
         """
-        if name in self.subroutine_table:
-            return self.subroutine_table[name]['type']
-        elif name in self.class_table:
-            return self.class_table[name]['type']
-        else:
-            raise Exception('identifier not found')
+        return self._entry(name).type
 
     def index_of(self, name):
         """
@@ -96,9 +144,4 @@ class SymbolTable:
         :param name: String
         :return: int
         """
-        if name in self.subroutine_table:
-            return self.subroutine_table[name]['index']
-        elif name in self.class_table:
-            return self.class_table[name]['index']
-        else:
-            raise Exception('identifier not found')
+        return self._entry(name).index
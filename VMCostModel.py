@@ -0,0 +1,136 @@
+import VMEmulator
+import json
+from collections import Counter
+"""
+Static cost model of generated VM code.
+Without running anything it reports, per function: VM instruction counts by command type,
+an estimate of the Hack instructions a straightforward VM translator emits for them,
+the call sites per callee, the calls to the expensive OS routines and the cost of
+initialising the local variables on entry.
+"""
+
+# Hack instructions emitted per VM command by a straightforward (non optimizing) translator
+HACK_COST = {
+    'push constant': 7,
+    'push local': 10,
+    'push argument': 10,
+    'push this': 10,
+    'push that': 10,
+    'push temp': 7,
+    'push pointer': 6,
+    'push static': 6,
+    'pop local': 12,
+    'pop argument': 12,
+    'pop this': 12,
+    'pop that': 12,
+    'pop temp': 7,
+    'pop pointer': 5,
+    'pop static': 5,
+    'add': 5,
+    'sub': 5,
+    'and': 5,
+    'or': 5,
+    'neg': 3,
+    'not': 3,
+    'eq': 13,
+    'gt': 13,
+    'lt': 13,
+    'label': 0,
+    'goto': 2,
+    'if-goto': 5,
+    'call': 47,
+    'function': 1,
+    'return': 40,
+}
+COST_PER_LOCAL = 5
+EXPENSIVE_CALLS = ['Math.multiply', 'Math.divide', 'String.new']
+
+
+def _command_type(command):
+    if command[0] in ('push', 'pop'):
+        return command[0] + ' ' + command[1]
+    return command[0]
+
+
+def analyze(text):
+    """
+    :param text: String, VM code
+    :return: dict, function name -> cost record
+    """
+    functions = {}
+    record = None
+    for command in VMEmulator.parse_vm(text):
+        if command[0] == 'function':
+            name = command[1]
+            n_locals = int(command[2])
+            record = functions[name] = {'vm_instructions': 0,
+                                        'commands': Counter(),
+                                        'hack_cost': 0,
+                                        'n_locals': n_locals,
+                                        'locals_init_cost': n_locals * COST_PER_LOCAL,
+                                        'calls': Counter(),
+                                        'expensive_calls': Counter()}
+            record['hack_cost'] += record['locals_init_cost']
+        elif record is None:
+            raise Exception('VM command outside of a function: {}'.format(' '.join(command)))
+        elif command[0] in ('push', 'pop') and command[1] == 'local' and int(command[2]) >= record['n_locals']:
+            # the initialisation cost comes from the header, which must cover every local used
+            raise Exception('{} declares {} locals but uses local {}'.format(name, record['n_locals'], command[2]))
+        command_type = _command_type(command)
+        if command_type not in HACK_COST:
+            raise Exception('unknown VM command: {}'.format(' '.join(command)))
+        if command_type != 'label':
+            record['vm_instructions'] += 1
+        record['commands'][command_type] += 1
+        record['hack_cost'] += HACK_COST[command_type]
+        if command[0] == 'call':
+            record['calls'][command[1]] += 1
+            if command[1] in EXPENSIVE_CALLS:
+                record['expensive_calls'][command[1]] += 1
+    return functions
+
+
+def analyze_files(paths):
+    """
+    :param paths: list of .vm file paths
+    :return: dict, function name -> cost record, over all the files
+    """
+    functions = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            functions.update(analyze(f.read()))
+    return functions
+
+
+def over_budget(functions, budget):
+    """
+    :param functions: dict, as returned by analyze
+    :param budget: int, max estimated Hack instructions per function
+    :return: list of the function names over budget
+    """
+    return [name for name, record in functions.items() if record['hack_cost'] > budget]
+
+
+def to_json(functions):
+    return json.dumps(functions, indent=2, sort_keys=True)
+
+
+def format_table(functions):
+    """
+    :param functions: dict, as returned by analyze
+    :return: String, one row per function, the most expensive first
+    """
+    lines = ['{:<36}{:>6}{:>8}{:>8}{:>10}{:>7}{:>7}{:>7}{:>8}'.format(
+        'function', 'vm', 'hack', 'locals', 'init cost', 'calls', 'mul', 'div', 'str.new')]
+    for name, r in sorted(functions.items(), key=lambda item: -item[1]['hack_cost']):
+        expensive = r['expensive_calls']
+        lines.append('{:<36}{:>6}{:>8}{:>8}{:>10}{:>7}{:>7}{:>7}{:>8}'.format(
+            name, r['vm_instructions'], r['hack_cost'], r['n_locals'], r['locals_init_cost'],
+            sum(r['calls'].values()), expensive['Math.multiply'], expensive['Math.divide'],
+            expensive['String.new']))
+        for callee, n in sorted(r['calls'].items(), key=lambda item: -item[1]):
+            lines.append('    {:<32}{:>6}'.format(callee, n))
+    total_vm = sum(r['vm_instructions'] for r in functions.values())
+    total_hack = sum(r['hack_cost'] for r in functions.values())
+    lines.append('{:<36}{:>6}{:>8}'.format('total', total_vm, total_hack))
+    return '\n'.join(lines)
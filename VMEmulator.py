@@ -0,0 +1,786 @@
+import argparse
+import json
+import math
+import os
+import struct
+import time
+from array import array
+from collections import Counter
+"""
+A headless emulator of the Hack VM, used to run the code the compiler generates and profile it
+without the course's Java tools.
+The VM text is decoded once into parallel integer arrays (opcode, operand, operand): labels and
+function names are resolved to code addresses, pointer/temp/static accesses to absolute RAM
+addresses. The 32K RAM is an array with the standard Hack memory map and call frames.
+The core OS classes (Math, Memory, Array, String, Output, Screen, Keyboard, Sys) are native
+Python functions, used for every OS function the loaded VM code does not define itself.
+Every executed instruction is counted per code address, which gives the per-function
+instruction and call counts of profile().
+"""
+
+# opcodes
+(PUSH_CONSTANT, PUSH_LOCAL, PUSH_ARGUMENT, PUSH_THIS, PUSH_THAT, PUSH_ADDRESS,
+ POP_LOCAL, POP_ARGUMENT, POP_THIS, POP_THAT, POP_ADDRESS,
+ ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT,
+ GOTO, IF_GOTO, CALL, CALL_NATIVE, FUNCTION, RETURN) = range(26)
+
+ARITHMETIC = {'add': ADD, 'sub': SUB, 'neg': NEG, 'eq': EQ, 'gt': GT, 'lt': LT, 'and': AND, 'or': OR, 'not': NOT}
+PUSH = {'local': PUSH_LOCAL, 'argument': PUSH_ARGUMENT, 'this': PUSH_THIS, 'that': PUSH_THAT}
+POP = {'local': POP_LOCAL, 'argument': POP_ARGUMENT, 'this': POP_THIS, 'that': POP_THAT}
+
+# memory map
+SP, LCL, ARG, THIS, THAT = 0, 1, 2, 3, 4
+POINTER = 3
+TEMP = 5
+STATIC = 16
+STATIC_END = 256
+STACK = 256
+HEAP = 2048
+HEAP_END = 16384
+SCREEN = 16384
+KBD = 24576
+RAM_SIZE = 32768
+
+# program written by VMLinker, holding the code of all the .vm files of its directory
+LINKED_SUFFIX = '.linked.vm'
+IMAGE_MAGIC = b'JVMI'
+IMAGE_VERSION = 1
+
+NEW_LINE = 128
+BACKSPACE = 129
+DOUBLE_QUOTE = 34
+
+
+class Halt(Exception):
+    pass
+
+
+class StackError(Exception):
+    pass
+
+
+def parse_vm(text):
+    """
+    :param text: String, VM code
+    :return: list of command lists, comments and blank lines removed
+    """
+    commands = []
+    for line in text.splitlines():
+        line = line.split('//', 1)[0].split()
+        if line:
+            commands.append(line)
+    return commands
+
+
+def _wrap(value):
+    value &= 0xFFFF
+    return value - 0x10000 if value > 0x7FFF else value
+
+
+class VMEmulator:
+    def __init__(self, keys=''):
+        """
+        :param keys: String, characters returned by the Keyboard read functions, in order
+        """
+        self.ram = array('i', bytes(4 * RAM_SIZE))
+        self.ops = array('i')
+        self.arg1 = array('i')
+        self.arg2 = array('i')
+        self.functions = {}
+        self.function_ranges = []
+        self.counts = []
+        self.native_calls = Counter()
+        self.output = []
+        self.keys = list(keys)
+        self.steps = 0
+
+        self._units = []
+        self._natives = []
+        self._native_index = {}
+        self._heap_top = HEAP
+        self._free = {}
+        self._sizes = {}
+        self._color = True
+
+    # loading
+
+    def load_source(self, name, text):
+        """
+        Adds the VM code of one class, decoded by decode()
+        :param name: String, the unit owning a static segment, usually the class name
+        :param text: String, VM code
+        """
+        self._units.append((name, parse_vm(text)))
+
+    def load_path(self, path):
+        """
+        Adds a .vm file or all the .vm files of a directory
+        :param path: String
+        """
+        if os.path.isdir(path):
+            # a linked program next to its classes is not loaded twice
+            files = sorted(os.path.join(path, file) for file in os.listdir(path)
+                           if file.endswith('.vm') and not file.endswith(LINKED_SUFFIX))
+        else:
+            files = [path]
+        for file in files:
+            with open(file, 'r') as f:
+                self.load_source(os.path.basename(file)[:-3], f.read())
+
+    def decode(self):
+        """
+        Resolves the loaded VM code into the integer instruction arrays
+        """
+        # first pass: addresses of functions and labels, static segment bases
+        address = 0
+        labels = {}
+        n_statics = {}
+        for unit, commands in self._units:
+            function = None
+            n_statics.setdefault(unit, 0)
+            for command in commands:
+                if command[0] == 'function':
+                    function = command[1]
+                    if function in self.functions:
+                        raise Exception('function {} defined twice'.format(function))
+                    self.functions[function] = address
+                elif command[0] == 'label':
+                    labels[(function, command[1])] = address
+                    continue
+                elif command[0] in ('push', 'pop') and command[1] == 'static':
+                    n_statics[unit] = max(n_statics[unit], int(command[2]) + 1)
+                address += 1
+        # one static segment per unit, even when its functions are loaded in several pieces
+        static_base = {}
+        next_static = STATIC
+        for unit, n in n_statics.items():
+            static_base[unit] = next_static
+            next_static += n
+        if next_static > STATIC_END:
+            raise Exception('static segment overflow')
+
+        # second pass: emit
+        ops, arg1, arg2 = self.ops, self.arg1, self.arg2
+        starts = []
+        for unit, commands in self._units:
+            function = None
+            for command in commands:
+                op = command[0]
+                a = b = 0
+                if op == 'push' or op == 'pop':
+                    segment, index = command[1], int(command[2])
+                    if segment == 'constant':
+                        assert op == 'push', 'pop constant'
+                        code, a = PUSH_CONSTANT, index
+                    elif segment in PUSH:
+                        code, a = (PUSH if op == 'push' else POP)[segment], index
+                    else:
+                        code = PUSH_ADDRESS if op == 'push' else POP_ADDRESS
+                        if segment == 'static':
+                            a = static_base[unit] + index
+                        elif segment == 'temp':
+                            assert index < 8, 'temp index out of range'
+                            a = TEMP + index
+                        elif segment == 'pointer':
+                            assert index < 2, 'pointer index out of range'
+                            a = POINTER + index
+                        else:
+                            raise Exception('unknown segment {}'.format(segment))
+                elif op in ARITHMETIC:
+                    code = ARITHMETIC[op]
+                elif op == 'label':
+                    continue
+                elif op == 'goto' or op == 'if-goto':
+                    code = GOTO if op == 'goto' else IF_GOTO
+                    if (function, command[1]) not in labels:
+                        raise Exception('unknown label {} in {}'.format(command[1], function))
+                    a = labels[(function, command[1])]
+                elif op == 'call':
+                    name, b = command[1], int(command[2])
+                    if name in self.functions:
+                        code, a = CALL, self.functions[name]
+                    elif name in NATIVES:
+                        code, a = CALL_NATIVE, self._native(name)
+                    else:
+                        raise Exception('unknown function {}'.format(name))
+                elif op == 'function':
+                    function = command[1]
+                    code, a = FUNCTION, int(command[2])
+                    starts.append((len(ops), function))
+                elif op == 'return':
+                    code = RETURN
+                else:
+                    raise Exception('unknown command {}'.format(' '.join(command)))
+                ops.append(code)
+                arg1.append(a)
+                arg2.append(b)
+
+        starts.append((len(ops), None))
+        self.function_ranges = [(start, starts[i + 1][0], name) for i, (start, name) in enumerate(starts[:-1])]
+        self.counts = [0] * len(ops)
+        self._units = []
+
+    def save_image(self, path):
+        """
+        Saves the decoded program, so it can be run again without parsing and resolving the VM text
+        :param path: String
+        """
+        with open(path, 'wb') as f:
+            f.write(IMAGE_MAGIC)
+            f.write(struct.pack('<HI', IMAGE_VERSION, len(self.ops)))
+            for code in (self.ops, self.arg1, self.arg2):
+                f.write(array('i', code).tobytes())
+            names = [name for name, native in self._natives]
+            functions = [(start, name) for start, end, name in self.function_ranges]
+            for table in (names, functions):
+                f.write(struct.pack('<I', len(table)))
+                for entry in table:
+                    if isinstance(entry, tuple):
+                        f.write(struct.pack('<I', entry[0]))
+                        entry = entry[1]
+                    data = entry.encode()
+                    f.write(struct.pack('<H', len(data)))
+                    f.write(data)
+
+    def load_image(self, path):
+        """
+        Loads a program saved by save_image (e.g. by the linker), instead of load_source and decode
+        :param path: String
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != IMAGE_MAGIC:
+            raise Exception('not a VM image: {}'.format(path))
+        version, n_code = struct.unpack_from('<HI', data, 4)
+        if version != IMAGE_VERSION:
+            raise Exception('unsupported VM image version {}'.format(version))
+        offset = 10
+        for code in (self.ops, self.arg1, self.arg2):
+            code.frombytes(data[offset:offset + 4 * n_code])
+            offset += 4 * n_code
+
+        tables = []
+        for has_address in (False, True):
+            (n,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            table = []
+            for _ in range(n):
+                address = None
+                if has_address:
+                    (address,) = struct.unpack_from('<I', data, offset)
+                    offset += 4
+                (length,) = struct.unpack_from('<H', data, offset)
+                offset += 2
+                name = data[offset:offset + length].decode()
+                offset += length
+                table.append(name if address is None else (address, name))
+            tables.append(table)
+
+        names, functions = tables
+        for name in names:
+            if name not in NATIVES:
+                raise Exception('unknown function {}'.format(name))
+            self._native(name)
+        starts = sorted(functions) + [(n_code, None)]
+        self.functions = {name: start for start, name in functions}
+        self.function_ranges = [(start, starts[i + 1][0], name) for i, (start, name) in enumerate(starts[:-1])]
+        self.counts = [0] * n_code
+
+    def _native(self, name):
+        if name not in self._native_index:
+            self._native_index[name] = len(self._natives)
+            self._natives.append((name, NATIVES[name]))
+        return self._native_index[name]
+
+    # execution
+
+    def run(self, entry=None, max_steps=None):
+        """
+        Runs the program until its entry function returns, Sys.halt is called or max_steps
+        instructions were executed.
+        :param entry: String, function to start from, Sys.init if defined, else Main.main
+        :param max_steps: int, None - no limit
+        :return: int, number of executed instructions
+        """
+        if entry is None:
+            entry = 'Sys.init' if 'Sys.init' in self.functions else 'Main.main'
+        if entry not in self.functions:
+            raise Exception('entry function {} not found'.format(entry))
+
+        ram = self.ram
+        ops, arg1, arg2 = self.ops, self.arg1, self.arg2
+        counts = self.counts
+        natives = self._natives
+
+        # call the entry function from a frame returning to address -1
+        # base: bottom of the working stack of the current frame, above its locals. The bases of the
+        # callers are kept in bases, so nothing pops or passes as arguments values of another frame
+        bases = []
+        sp = STACK
+        for i in range(5):
+            ram[sp + i] = -1 if i == 0 else ram[LCL + i - 1]
+        sp += 5
+        ram[ARG] = sp
+        ram[LCL] = sp
+        base = sp
+        pc = self.functions[entry]
+
+        remaining = -1 if max_steps is None else max_steps
+        executed = 0
+        try:
+            while pc >= 0 and remaining != 0:
+                remaining -= 1
+                executed += 1
+                counts[pc] += 1
+                op = ops[pc]
+                if op < ADD:
+                    if op == PUSH_CONSTANT:
+                        ram[sp] = arg1[pc]
+                        sp += 1
+                    elif op == PUSH_LOCAL:
+                        ram[sp] = ram[ram[LCL] + arg1[pc]]
+                        sp += 1
+                    elif op == PUSH_ARGUMENT:
+                        ram[sp] = ram[ram[ARG] + arg1[pc]]
+                        sp += 1
+                    elif op == PUSH_THIS:
+                        ram[sp] = ram[ram[THIS] + arg1[pc]]
+                        sp += 1
+                    elif op == PUSH_THAT:
+                        ram[sp] = ram[ram[THAT] + arg1[pc]]
+                        sp += 1
+                    elif op == PUSH_ADDRESS:
+                        ram[sp] = ram[arg1[pc]]
+                        sp += 1
+                    elif op == POP_LOCAL:
+                        sp -= 1
+                        ram[ram[LCL] + arg1[pc]] = ram[sp]
+                    elif op == POP_ARGUMENT:
+                        sp -= 1
+                        ram[ram[ARG] + arg1[pc]] = ram[sp]
+                    elif op == POP_THIS:
+                        sp -= 1
+                        ram[ram[THIS] + arg1[pc]] = ram[sp]
+                    elif op == POP_THAT:
+                        sp -= 1
+                        ram[ram[THAT] + arg1[pc]] = ram[sp]
+                    else:
+                        sp -= 1
+                        ram[arg1[pc]] = ram[sp]
+                    pc += 1
+                elif op < GOTO:
+                    if op == NEG:
+                        value = -ram[sp - 1]
+                        ram[sp - 1] = -32768 if value == 32768 else value
+                    elif op == NOT:
+                        ram[sp - 1] = ~ram[sp - 1]
+                    else:
+                        sp -= 1
+                        x = ram[sp - 1]
+                        y = ram[sp]
+                        if op == ADD:
+                            value = x + y
+                            ram[sp - 1] = value - 65536 if value > 32767 else value + 65536 if value < -32768 else value
+                        elif op == SUB:
+                            value = x - y
+                            ram[sp - 1] = value - 65536 if value > 32767 else value + 65536 if value < -32768 else value
+                        elif op == EQ:
+                            ram[sp - 1] = -1 if x == y else 0
+                        elif op == GT:
+                            ram[sp - 1] = -1 if x > y else 0
+                        elif op == LT:
+                            ram[sp - 1] = -1 if x < y else 0
+                        elif op == AND:
+                            ram[sp - 1] = x & y
+                        else:
+                            ram[sp - 1] = x | y
+                    pc += 1
+                elif op == IF_GOTO:
+                    sp -= 1
+                    pc = arg1[pc] if ram[sp] else pc + 1
+                elif op == GOTO:
+                    pc = arg1[pc]
+                elif op == CALL:
+                    if arg2[pc] > sp - base:
+                        raise StackError('{} calls {} with {} arguments, {} values on its stack'.format(
+                            self.function_at(pc), self.function_at(arg1[pc]), arg2[pc], sp - base))
+                    bases.append(base)
+                    ram[sp] = pc + 1
+                    ram[sp + 1] = ram[LCL]
+                    ram[sp + 2] = ram[ARG]
+                    ram[sp + 3] = ram[THIS]
+                    ram[sp + 4] = ram[THAT]
+                    sp += 5
+                    ram[ARG] = sp - 5 - arg2[pc]
+                    ram[LCL] = sp
+                    pc = arg1[pc]
+                elif op == FUNCTION:
+                    for _ in range(arg1[pc]):
+                        ram[sp] = 0
+                        sp += 1
+                    base = sp
+                    pc += 1
+                elif op == RETURN:
+                    if sp <= base:
+                        raise StackError('{} returns without a value on its stack'.format(self.function_at(pc)))
+                    base = bases.pop() if bases else STACK
+                    frame = ram[LCL]
+                    arg = ram[ARG]
+                    ram[arg] = ram[sp - 1]
+                    sp = arg + 1
+                    ram[THAT] = ram[frame - 1]
+                    ram[THIS] = ram[frame - 2]
+                    ram[ARG] = ram[frame - 3]
+                    ram[LCL] = ram[frame - 4]
+                    pc = ram[frame - 5]
+                else:
+                    # CALL_NATIVE
+                    n_args = arg2[pc]
+                    if n_args > sp - base:
+                        raise StackError('{} calls {} with {} arguments, {} values on its stack'.format(
+                            self.function_at(pc), natives[arg1[pc]][0], n_args, sp - base))
+                    sp -= n_args
+                    ram[SP] = sp
+                    name, native = natives[arg1[pc]]
+                    self.native_calls[name] += 1
+                    value = native(self, *ram[sp:sp + n_args])
+                    ram[sp] = _wrap(value or 0)
+                    sp += 1
+                    pc += 1
+                if sp >= HEAP or sp < base:
+                    # pc may have moved on, pc - 1 is the instruction of a pop that went too far
+                    if sp >= HEAP:
+                        raise StackError('stack overflow in {}'.format(self.function_at(pc - 1)))
+                    raise StackError('stack underflow in {}, popped below its frame'.format(self.function_at(pc - 1)))
+        except Halt:
+            pass
+        finally:
+            ram[SP] = sp
+            self.steps += executed
+        return executed
+
+    def function_at(self, address):
+        """
+        :param address: int, code address
+        :return: String, name of the function the address belongs to
+        """
+        for start, end, name in self.function_ranges:
+            if start <= address < end:
+                return name
+        return '?'
+
+    # profiling
+
+    def profile(self):
+        """
+        :return: dict, function name -> {'instructions': executed VM instructions, 'calls': int},
+                 natives included, with 'instructions': 0
+        """
+        counts = self.counts
+        profile = {}
+        for start, end, name in self.function_ranges:
+            profile[name] = {'instructions': sum(counts[start:end]), 'calls': counts[start]}
+        for name, calls in self.native_calls.items():
+            profile[name] = {'instructions': 0, 'calls': calls}
+        return profile
+
+    def report(self, top=20):
+        """
+        :param top: int, number of functions listed
+        :return: String, human readable profile, the most expensive functions first
+        """
+        rows = sorted(self.profile().items(), key=lambda item: (-item[1]['instructions'], -item[1]['calls']))
+        lines = ['{} instructions executed'.format(self.steps),
+                 '{:<40}{:>14}{:>10}'.format('function', 'instructions', 'calls')]
+        for name, row in rows[:top]:
+            lines.append('{:<40}{:>14}{:>10}'.format(name, row['instructions'], row['calls']))
+        return '\n'.join(lines)
+
+    # OS support
+
+    def alloc(self, size):
+        size = max(size, 1)
+        free = self._free.get(size)
+        if free:
+            address = free.pop()
+        else:
+            address = self._heap_top
+            if address + size > HEAP_END:
+                raise Exception('heap overflow')
+            self._heap_top += size
+        self._sizes[address] = size
+        return address
+
+    def de_alloc(self, address):
+        size = self._sizes.pop(address, None)
+        if size is not None:
+            self._free.setdefault(size, []).append(address)
+
+    def new_string(self, text):
+        address = string_new(self, len(text))
+        for char in text:
+            string_append_char(self, address, ord(char))
+        return address
+
+    def string_text(self, address):
+        ram = self.ram
+        return ''.join(chr(ram[address + 2 + i]) if 0 <= ram[address + 2 + i] < 128 else '?'
+                       for i in range(ram[address + 1]))
+
+    def draw_pixel(self, x, y):
+        if 0 <= x < 512 and 0 <= y < 256:
+            address = SCREEN + y * 32 + x // 16
+            bit = 1 << (x % 16)
+            value = self.ram[address] & 0xFFFF
+            value = value | bit if self._color else value & ~bit
+            self.ram[address] = _wrap(value)
+
+
+# native OS, each takes the emulator and the call arguments and returns the pushed value
+
+def string_new(emu, max_length):
+    if max_length < 0:
+        raise Exception('String.new: negative length')
+    address = emu.alloc(max_length + 2)
+    emu.ram[address] = max_length
+    emu.ram[address + 1] = 0
+    return address
+
+
+def string_append_char(emu, this, c):
+    ram = emu.ram
+    length = ram[this + 1]
+    if length >= ram[this]:
+        raise Exception('String.appendChar: string is full')
+    ram[this + 2 + length] = c
+    ram[this + 1] = length + 1
+    return this
+
+
+def string_erase_last_char(emu, this):
+    if emu.ram[this + 1] > 0:
+        emu.ram[this + 1] -= 1
+
+
+def string_int_value(emu, this):
+    text = emu.string_text(this)
+    digits = ''
+    for i, char in enumerate(text):
+        if char.isdigit() or (i == 0 and char == '-'):
+            digits += char
+        else:
+            break
+    return int(digits) if digits not in ('', '-') else 0
+
+
+def string_set_int(emu, this, value):
+    emu.ram[this + 1] = 0
+    for char in str(value):
+        string_append_char(emu, this, ord(char))
+
+
+def math_divide(emu, x, y):
+    if y == 0:
+        raise Exception('Math.divide: division by zero')
+    return int(x / y)
+
+
+def math_sqrt(emu, x):
+    if x < 0:
+        raise Exception('Math.sqrt: negative argument')
+    return math.isqrt(x)
+
+
+def output_print_char(emu, c):
+    if c == NEW_LINE:
+        emu.output.append('\n')
+    elif c == BACKSPACE:
+        if emu.output:
+            emu.output.pop()
+    else:
+        emu.output.append(chr(c) if 0 <= c < 128 else '?')
+
+
+def output_print_string(emu, s):
+    emu.output.append(emu.string_text(s))
+
+
+def output_print_int(emu, i):
+    emu.output.append(str(i))
+
+
+def screen_set_color(emu, b):
+    emu._color = b != 0
+
+
+def screen_clear(emu):
+    for address in range(SCREEN, KBD):
+        emu.ram[address] = 0
+
+
+def screen_draw_line(emu, x1, y1, x2, y2):
+    dx, dy = abs(x2 - x1), -abs(y2 - y1)
+    step_x = 1 if x1 < x2 else -1
+    step_y = 1 if y1 < y2 else -1
+    error = dx + dy
+    while True:
+        emu.draw_pixel(x1, y1)
+        if x1 == x2 and y1 == y2:
+            return
+        if 2 * error >= dy:
+            error += dy
+            x1 += step_x
+        if 2 * error <= dx:
+            error += dx
+            y1 += step_y
+
+
+def screen_draw_rectangle(emu, x1, y1, x2, y2):
+    for y in range(y1, y2 + 1):
+        for x in range(x1, x2 + 1):
+            emu.draw_pixel(x, y)
+
+
+def screen_draw_circle(emu, x, y, r):
+    for dy in range(-r, r + 1):
+        half = math.isqrt(r * r - dy * dy)
+        for dx in range(-half, half + 1):
+            emu.draw_pixel(x + dx, y + dy)
+
+
+def keyboard_read_char(emu):
+    c = ord(emu.keys.pop(0)) if emu.keys else 0
+    output_print_char(emu, c)
+    return c
+
+
+def keyboard_read_line(emu, message):
+    output_print_string(emu, message)
+    text = ''
+    while emu.keys:
+        char = emu.keys.pop(0)
+        if char == '\n':
+            break
+        text += char
+    emu.output.append(text + '\n')
+    return emu.new_string(text)
+
+
+def keyboard_read_int(emu, message):
+    line = keyboard_read_line(emu, message)
+    value = string_int_value(emu, line)
+    emu.de_alloc(line)
+    return value
+
+
+def sys_halt(emu):
+    raise Halt()
+
+
+def sys_error(emu, code):
+    raise Exception('Sys.error {}'.format(code))
+
+
+def _nothing(emu, *args):
+    return 0
+
+
+NATIVES = {
+    'Math.init': _nothing,
+    'Math.abs': lambda emu, x: abs(x),
+    'Math.multiply': lambda emu, x, y: x * y,
+    'Math.divide': math_divide,
+    'Math.min': lambda emu, x, y: min(x, y),
+    'Math.max': lambda emu, x, y: max(x, y),
+    'Math.sqrt': math_sqrt,
+    'Memory.init': _nothing,
+    'Memory.peek': lambda emu, address: emu.ram[address],
+    'Memory.poke': lambda emu, address, value: emu.ram.__setitem__(address, value),
+    'Memory.alloc': lambda emu, size: emu.alloc(size),
+    'Memory.deAlloc': lambda emu, o: emu.de_alloc(o),
+    'Array.new': lambda emu, size: emu.alloc(size),
+    'Array.dispose': lambda emu, this: emu.de_alloc(this),
+    'String.new': string_new,
+    'String.dispose': lambda emu, this: emu.de_alloc(this),
+    'String.length': lambda emu, this: emu.ram[this + 1],
+    'String.charAt': lambda emu, this, j: emu.ram[this + 2 + j],
+    'String.setCharAt': lambda emu, this, j, c: emu.ram.__setitem__(this + 2 + j, c),
+    'String.appendChar': string_append_char,
+    'String.eraseLastChar': string_erase_last_char,
+    'String.intValue': string_int_value,
+    'String.setInt': string_set_int,
+    'String.backSpace': lambda emu: BACKSPACE,
+    'String.doubleQuote': lambda emu: DOUBLE_QUOTE,
+    'String.newLine': lambda emu: NEW_LINE,
+    'Output.init': _nothing,
+    'Output.moveCursor': _nothing,
+    'Output.printChar': output_print_char,
+    'Output.printString': output_print_string,
+    'Output.printInt': output_print_int,
+    'Output.println': lambda emu: output_print_char(emu, NEW_LINE),
+    'Output.backSpace': lambda emu: output_print_char(emu, BACKSPACE),
+    'Screen.init': _nothing,
+    'Screen.clearScreen': screen_clear,
+    'Screen.setColor': screen_set_color,
+    'Screen.drawPixel': lambda emu, x, y: emu.draw_pixel(x, y),
+    'Screen.drawLine': screen_draw_line,
+    'Screen.drawRectangle': screen_draw_rectangle,
+    'Screen.drawCircle': screen_draw_circle,
+    'Keyboard.init': _nothing,
+    'Keyboard.keyPressed': lambda emu: emu.ram[KBD],
+    'Keyboard.readChar': keyboard_read_char,
+    'Keyboard.readLine': keyboard_read_line,
+    'Keyboard.readInt': keyboard_read_int,
+    'Sys.init': _nothing,
+    'Sys.halt': sys_halt,
+    'Sys.error': sys_error,
+    'Sys.wait': _nothing,
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='headless Hack VM emulator and profiler')
+    parser.add_argument('path', nargs='+', help='.vm files, directories of .vm files or a linked .vmimg image')
+    parser.add_argument('--compile', action='store_true',
+                        help='compile the .jack files of the given directories in memory instead of reading .vm files')
+    parser.add_argument('--entry', help='function to start from, default Sys.init or Main.main')
+    parser.add_argument('--max-steps', type=int, help='stop after that many VM instructions')
+    parser.add_argument('--keys', default='', help='keyboard input of the program')
+    parser.add_argument('--top', type=int, default=20, help='number of functions in the profile')
+    parser.add_argument('--json', metavar='FILE', help='save the profile as JSON')
+    args = parser.parse_args(args)
+
+    emu = VMEmulator(args.keys)
+    if args.path[0].endswith('.vmimg'):
+        assert len(args.path) == 1 and not args.compile, 'a VM image is a whole program'
+        emu.load_image(args.path[0])
+    else:
+        for path in args.path:
+            if args.compile:
+                import JackAnalyzer
+                sources = {}
+                for file in JackAnalyzer.jack_files(path.rstrip('/')):
+                    with open(file, 'r') as f:
+                        sources[os.path.basename(file)[:-5]] = f.read()
+                for name, (xml, vm) in JackAnalyzer.compile_sources(sources).items():
+                    emu.load_source(name, vm)
+            else:
+                emu.load_path(path)
+        emu.decode()
+
+    start = time.perf_counter()
+    emu.run(args.entry, args.max_steps)
+    elapsed = time.perf_counter() - start
+
+    if emu.output:
+        print(''.join(emu.output))
+    print(emu.report(args.top))
+    print('{:.3f} s, {:.0f} instructions/s'.format(elapsed, emu.steps / elapsed if elapsed else 0))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'steps': emu.steps, 'seconds': elapsed, 'functions': emu.profile()}, f, indent=2,
+                      sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import VMEmulator
+import os
+"""
+Links the VM files of a program into a single program.
+The functions of all the classes go into one global function index; every call is resolved
+against it (or the OS) and its number of arguments checked against the parameter list the
+callee was compiled with, so a bad call fails the build instead of the program at runtime.
+The functions are ordered by a depth first walk of the call graph from the entry function,
+which puts callees next to their first caller, and unreachable functions last.
+Static variables are relocated to one segment, each class getting its own range of it.
+The result is written as linked VM text and as a decoded VMEmulator image.
+"""
+
+LINKED_SUFFIX = VMEmulator.LINKED_SUFFIX
+IMAGE_SUFFIX = '.vmimg'
+ENTRIES = ['Sys.init', 'Main.main']
+
+
+class LinkError(Exception):
+    pass
+
+
+def split_functions(units):
+    """
+    :param units: dict, class name -> VM code
+    :return: dict, function name -> (class name, list of commands), in the order of the units
+    """
+    functions = {}
+    for unit, text in units.items():
+        commands = None
+        for command in VMEmulator.parse_vm(text):
+            if command[0] == 'function':
+                if command[1] in functions:
+                    raise LinkError('function {} defined twice'.format(command[1]))
+                commands = []
+                functions[command[1]] = (unit, commands)
+            elif commands is None:
+                raise LinkError('{}: VM command outside of a function: {}'.format(unit, ' '.join(command)))
+            commands.append(command)
+    return functions
+
+
+def call_order(functions, entry=None):
+    """
+    :param functions: dict, as returned by split_functions
+    :param entry: String, default Sys.init if defined, else Main.main
+    :return: list of function names, reachable ones in depth first call order, then the others
+    """
+    if entry is None:
+        entry = next((name for name in ENTRIES if name in functions), None)
+    order = []
+    seen = set()
+    stack = [entry] if entry in functions else []
+    while stack:
+        name = stack.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        order.append(name)
+        callees = [command[1] for command in functions[name][1] if command[0] == 'call']
+        stack.extend(callee for callee in reversed(callees) if callee in functions and callee not in seen)
+    order.extend(name for name in functions if name not in seen)
+    return order
+
+
+def check_calls(functions, signatures):
+    """
+    :param functions: dict, as returned by split_functions
+    :param signatures: dict, function name -> SignatureIndex.Signature, see CompilationEngine.subroutines
+    :return: list of error messages, unresolved calls and calls with the wrong number of arguments
+    """
+    errors = []
+    for name, (unit, commands) in functions.items():
+        for command in commands:
+            if command[0] != 'call':
+                continue
+            callee, n_args = command[1], int(command[2])
+            if callee not in functions:
+                if callee not in VMEmulator.NATIVES:
+                    errors.append('{}: call to unknown function {}'.format(name, callee))
+                continue
+            if callee not in signatures:
+                continue
+            signature = signatures[callee]
+            expected = signature.n_params + 1 if signature.kind == 'method' else signature.n_params
+            if n_args != expected:
+                errors.append('{}: {} called with {} arguments, {} {} takes {}'.format(
+                    name, callee, n_args, signature.kind, callee, expected))
+    return errors
+
+
+def link(units, signatures, entry=None):
+    """
+    :param units: dict, class name -> VM code
+    :param signatures: dict, function name -> SignatureIndex.Signature
+    :param entry: String, entry function, default Sys.init if defined, else Main.main
+    :return: String, the linked VM code
+    """
+    functions = split_functions(units)
+    errors = check_calls(functions, signatures)
+    if errors:
+        raise LinkError('\n'.join(errors))
+    order = call_order(functions, entry)
+
+    n_statics = {}
+    for unit, commands in functions.values():
+        n_statics.setdefault(unit, 0)
+        for command in commands:
+            if command[0] in ('push', 'pop') and command[1] == 'static':
+                n_statics[unit] = max(n_statics[unit], int(command[2]) + 1)
+    static_base = {}
+    next_static = 0
+    for unit, n in n_statics.items():
+        static_base[unit] = next_static
+        next_static += n
+    if VMEmulator.STATIC + next_static > VMEmulator.STATIC_END:
+        raise LinkError('static segment overflow')
+
+    lines = ['// function index']
+    lines.extend('// {} {}'.format(i, name) for i, name in enumerate(order))
+    for name in order:
+        unit, commands = functions[name]
+        for command in commands:
+            if command[0] in ('push', 'pop') and command[1] == 'static':
+                command = [command[0], 'static', str(static_base[unit] + int(command[2]))]
+            lines.append(' '.join(command))
+    return '\n'.join(lines) + '\n'
+
+
+def link_directory(dir_path, vm_paths, signatures, entry=None):
+    """
+    Writes <dir>/<dir name>.linked.vm and <dir>/<dir name>.vmimg
+    :param dir_path: String
+    :param vm_paths: list of the .vm files of the program
+    :param signatures: dict, function name -> SignatureIndex.Signature
+    :param entry: String
+    :return: (linked VM path, image path)
+    """
+    units = {}
+    for path in vm_paths:
+        with open(path, 'r') as f:
+            units[os.path.basename(path)[:-3]] = f.read()
+    text = link(units, signatures, entry)
+
+    emu = VMEmulator.VMEmulator()
+    emu.load_source(os.path.basename(dir_path), text)
+    try:
+        emu.decode()
+    except Exception as e:
+        raise LinkError(str(e))
+
+    base = os.path.join(dir_path, os.path.basename(dir_path))
+    with open(base + LINKED_SUFFIX, 'w') as f:
+        f.write(text)
+    emu.save_image(base + IMAGE_SUFFIX)
+    return base + LINKED_SUFFIX, base + IMAGE_SUFFIX
@@ -3,9 +3,14 @@ class VMWriter:
         """
         creates a new file and prepares it for writing
         VM commands
-        :param output_file: String
-        """
-        self.f = open(output_file, 'w')
+        :param output_file: String, or an already open text stream (e.g. io.StringIO)
+        """
+        if isinstance(output_file, str):
+            self.f = open(output_file, 'w')
+            self._owns_file = True
+        else:
+            self.f = output_file
+            self._owns_file = False
 
     def write_push(self, segment, index):
         """
@@ -31,7 +36,7 @@ class VMWriter:
         :param command: ADD,SUB,NEG,EQ,GT,LT,AND,OR,NOT
         :return:
         """
-        self.f.write(command.lower())
+        self.f.write(command.lower() + "\n")
 
     def write_label(self, label):
         """
@@ -39,15 +44,15 @@ class VMWriter:
         :param label: String
         :return:
         """
-        raise Exception()
+        self.f.write("label {}\n".format(label))
 
     def write_goto(self, label):
         """
-        Writes a VM label command
+        Writes a VM goto command
         :param label: String
         :return:
         """
-        raise Exception()
+        self.f.write("goto {}\n".format(label))
 
     def write_if(self, label):
         """
@@ -55,7 +60,7 @@ class VMWriter:
         :param label: String
         :return:
         """
-        raise Exception()
+        self.f.write("if-goto {}\n".format(label))
 
     def write_call(self, name, n_args):
         """
@@ -64,7 +69,7 @@ class VMWriter:
         :param n_args: int
         :return:
         """
-        self.f.write("call {} {}".format(name, n_args))
+        self.f.write("call {} {}\n".format(name, n_args))
 
     def write_function(self, name, n_locals):
         """
@@ -73,7 +78,7 @@ class VMWriter:
         :param n_locals: int
         :return:
         """
-        self.f.write("function {} {}".format(name, n_locals))
+        self.f.write("function {} {}\n".format(name, n_locals))
 
     def write_return(self):
         """
@@ -84,7 +89,8 @@ class VMWriter:
 
     def close(self):
         """
-        closes the output file
+        closes the output file, a stream given by the caller is left open
         :return:
         """
-        self.f.close()
+        if self._owns_file:
+            self.f.close()
@@ -0,0 +1,484 @@
+import JackTokenizer as Tk
+import CompilationEngine as CmpE
+import JackAnalyzer
+import InternTable
+import SymbolTable
+import VMEmulator
+import VMWriter
+from benchmark.JackGenerator import JackGenerator, nested_expression_class
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+"""
+Times the three stages of the compiler separately:
+tokenizer - JackTokenizer over the source text,
+engine - CompilationEngine over the token stream, XML included, VM commands only recorded,
+vmwriter - VMWriter replaying the recorded VM commands.
+Every timing is the best of `repeat` runs, in seconds.
+"""
+
+PHASES = ['tokenizer', 'engine', 'vmwriter']
+SWEEP_PARAMETERS = ['subroutines', 'statements', 'depth', 'expression_length', 'fields',
+                    'string_density', 'comment_density']
+TOLERANCE = 0.10
+MAX_BYTES_PER_SOURCE_BYTE = 40
+NESTING_DEPTHS = (10, 100, 200)
+PROGRAM_MAX_STEPS = 1000000
+
+
+class _Recorder:
+    """
+    Stands in for the VMWriter of a CompilationEngine, recording the calls it receives
+    """
+    def __init__(self):
+        self.commands = []
+
+    def __getattr__(self, method):
+        commands = self.commands
+
+        def record(*args):
+            commands.append((method, args))
+        return record
+
+
+def best_of(repeat, func):
+    """
+    :param repeat: int
+    :param func: callable without arguments
+    :return: float, the fastest of repeat runs, in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_source(source, repeat=3):
+    """
+    Times each phase of the compiler over one class.
+    :param source: String, jack source of one class
+    :param repeat: int
+    :return: dict, phase/size name -> value
+    """
+    tokens = Tk.JackTokenizer(source=source).token_ids
+
+    def engine():
+        compiler = CmpE.CompilationEngine(Tk.JackTokenizer.from_token_ids(tokens), io.StringIO(), io.StringIO())
+        compiler.writer = _Recorder()
+        compiler.compile_class()
+        return compiler.writer.commands
+
+    commands = engine()
+
+    def vm_writer():
+        writer = VMWriter.VMWriter(io.StringIO())
+        for method, args in commands:
+            getattr(writer, method)(*args)
+
+    return {'source_bytes': len(source.encode()),
+            'tokens': len(tokens),
+            'vm_commands': len(commands),
+            'tokenizer': best_of(repeat, lambda: Tk.JackTokenizer(source=source)),
+            'engine': best_of(repeat, engine),
+            'vmwriter': best_of(repeat, vm_writer)}
+
+
+def bench_memory(source):
+    """
+    Measures the peak memory of compiling one class in memory, XML and VM outputs included.
+    :param source: String, jack source of one class
+    :return: dict
+    """
+    source_bytes = len(source.encode())
+    tracemalloc.start()
+    try:
+        tk = Tk.JackTokenizer(source=source)
+        compiler = CmpE.CompilationEngine(tk, io.StringIO(), io.StringIO())
+        compiler.compile_class()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'source_bytes': source_bytes,
+            'peak': peak,
+            'bytes_per_source_byte': peak / source_bytes}
+
+
+def run_memory_sweep(parameter='subroutines', values=(4, 16, 64, 256), seed=0, **fixed):
+    """
+    Like run_sweep, measuring peak memory instead of time
+    :return: dict, case name -> bench_memory result
+    """
+    assert parameter in SWEEP_PARAMETERS, 'unknown sweep parameter'
+    cases = {}
+    for value in values:
+        params = dict(fixed)
+        params[parameter] = value
+        source = JackGenerator(seed=seed, **params).generate_class('Gen')
+        cases['{}={}'.format(parameter, value)] = bench_memory(source)
+    return cases
+
+
+def over_memory_bound(cases, max_bytes_per_source_byte=MAX_BYTES_PER_SOURCE_BYTE):
+    """
+    :param cases: dict, as returned by run_memory_sweep
+    :param max_bytes_per_source_byte: float, upper bound of peak memory per source byte
+    :return: list of the case names above the bound
+    """
+    return [case for case, r in cases.items() if r['bytes_per_source_byte'] > max_bytes_per_source_byte]
+
+
+def format_memory(cases):
+    lines = ['{:<24}{:>10}{:>12}{:>16}'.format('case', 'bytes', 'peak', 'bytes/src byte')]
+    for case, r in cases.items():
+        lines.append('{:<24}{:>10}{:>12}{:>16.1f}'.format(case, r['source_bytes'], r['peak'],
+                                                         r['bytes_per_source_byte']))
+    return '\n'.join(lines)
+
+
+class _ChainedDispatch(CmpE.CompilationEngine):
+    """
+    The CompilationEngine with the branching it had before its dispatch tables: list scans and if/elif
+    chains re-reading the current token, peeking at the next one for every term.
+    The rules themselves are the engine's, so only the dispatch differs.
+    """
+    OP = ['+', '-', '*', '/', '&amp;', '|', '&lt;', '&gt;', '=']
+    UNARY_OP = ['-', '~']
+
+    def compile_statements(self):
+        self.f.write("<statements>\n")
+        while self.tk.token_val() in ['let', 'if', 'while', 'do', 'return']:
+            if self.tk.token_val() == 'return':
+                self.compile_return()
+            elif self.tk.token_val() == 'if':
+                self.compile_if()
+            elif self.tk.token_val() == 'let':
+                self.compile_let()
+            elif self.tk.token_val() == 'do':
+                self.compile_do()
+            else:
+                self.compile_while()
+        self.f.write("</statements>\n")
+
+    def compile_expression(self):
+        self.f.write("<expression>\n")
+        self.compile_term()
+        while self.tk.token_val() in self.OP:
+            self.write_elementary_expression_and_advance()
+            self.compile_term()
+        self.f.write("</expression>\n")
+
+    def compile_term(self):
+        self.f.write("<term>\n")
+        if self.tk.peek_next_val() == '[':
+            self._term_array()
+        elif self.tk.peek_next_val() == '.':
+            self.compile_subroutine_call()
+        elif self.tk.token_val() == '(':
+            self._term_parenthesized()
+        elif self.tk.token_val() in self.UNARY_OP:
+            self.write_elementary_expression_and_advance()
+            self.compile_term()
+        elif self.tk.token_type() in ['integerConstant', 'stringConstant', 'keyword']:
+            self.write_elementary_expression_and_advance()
+        else:
+            self._term_var()
+        self.f.write("</term>\n")
+
+
+def bench_parser(depths=NESTING_DEPTHS, repeat=3):
+    """
+    Microbenchmark of the CompilationEngine on deeply nested expressions, against the same engine
+    dispatching through chained comparisons (_ChainedDispatch), over the same token stream.
+    :param depths: list of nesting depths
+    :param repeat: int
+    :return: dict, 'depth=N' -> {'tables': engine seconds, 'chained': seconds with chained dispatch}
+    """
+    parser = {}
+    for depth in depths:
+        tokens = Tk.JackTokenizer(source=nested_expression_class(depth)).token_ids
+        timings = {}
+        # the two engines take turns, so a slow spell of the machine does not favour either
+        for _ in range(repeat):
+            for name, engine_class in (('tables', CmpE.CompilationEngine), ('chained', _ChainedDispatch)):
+                def engine():
+                    compiler = engine_class(Tk.JackTokenizer.from_token_ids(tokens), io.StringIO(), io.StringIO())
+                    compiler.compile_class()
+                elapsed = best_of(1, engine)
+                timings[name] = min(timings.get(name, elapsed), elapsed)
+        parser['depth={}'.format(depth)] = timings
+    return parser
+
+
+def bench_symbol_table(n_names=64, repeat=3):
+    """
+    Compares resolving every name through the single-probe lookup with the kind_of/index_of wrappers.
+    :param n_names: int
+    :param repeat: int
+    :return: dict
+    """
+    table = SymbolTable.SymbolTable()
+    names = []
+    for i in range(n_names):
+        names.append('c{}'.format(i))
+        table.define(names[-1], 'int', 'FIELD')
+        names.append('v{}'.format(i))
+        table.define(names[-1], 'int', 'VAR')
+    names *= 100
+
+    def lookup():
+        for name in names:
+            symbol = table.lookup(name)
+            symbol.kind, symbol.index
+
+    def wrappers():
+        for name in names:
+            table.kind_of(name), table.index_of(name)
+
+    return {'lookup': best_of(repeat, lookup), 'wrappers': best_of(repeat, wrappers)}
+
+
+def bench_interning(sources, repeat=3):
+    """
+    Measures what the shared intern table saves over a multi-class corpus:
+    the memory of the token streams as ID arrays instead of lists of separately allocated strings,
+    and symbol lookups with the canonical (identical) name objects instead of equal copies.
+    :param sources: dict, class name -> jack source
+    :param repeat: int
+    :return: dict
+    """
+    tokenizers = [Tk.JackTokenizer(source=source) for source in sources.values()]
+    id_bytes = sum(sys.getsizeof(tk.token_ids) for tk in tokenizers)
+    # what per-file token lists cost: a pointer per token and one string per distinct value per file
+    list_bytes = 0
+    for tk in tokenizers:
+        tokens = tk.token_str_list
+        list_bytes += sys.getsizeof(tokens) + sum(sys.getsizeof(text) for text in set(tokens) if len(text) > 1)
+
+    table = SymbolTable.SymbolTable()
+    canonical = [text for text in set(tokenizers[0].token_str_list) if text[0].isalpha()]
+    for name in canonical:
+        table.define(name, 'int', 'VAR')
+    copies = [(name + '.')[:-1] for name in canonical]
+    canonical *= 100
+    copies *= 100
+
+    def lookup_canonical():
+        for name in canonical:
+            table.lookup(name)
+
+    def lookup_copies():
+        for name in copies:
+            table.lookup(name)
+
+    return {'token_stream_bytes': id_bytes,
+            'token_list_bytes': list_bytes,
+            'lookup_canonical': best_of(repeat, lookup_canonical),
+            'lookup_copies': best_of(repeat, lookup_copies),
+            'table': InternTable.TABLE.stats()}
+
+
+def run_sweep(parameter='subroutines', values=(4, 16, 64, 256), repeat=3, seed=0, **fixed):
+    """
+    Generates one class per value of the swept generator parameter and benchmarks it.
+    :param parameter: String, a JackGenerator parameter
+    :param values: list of values of that parameter
+    :param repeat: int
+    :param seed: int
+    :param fixed: other JackGenerator parameters
+    :return: dict, JSON ready results
+    """
+    assert parameter in SWEEP_PARAMETERS, 'unknown sweep parameter'
+    cases = {}
+    for value in values:
+        params = dict(fixed)
+        params[parameter] = value
+        source = JackGenerator(seed=seed, **params).generate_class('Gen')
+        cases['{}={}'.format(parameter, value)] = bench_source(source, repeat)
+
+    return {'meta': {'python': platform.python_version(),
+                     'implementation': platform.python_implementation(),
+                     'machine': platform.machine(),
+                     'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                     'parameter': parameter,
+                     'seed': seed,
+                     'repeat': repeat,
+                     'fixed': fixed},
+            'cases': cases,
+            'parser': bench_parser(repeat=repeat),
+            'symbol_table': bench_symbol_table(repeat=repeat),
+            'interning': bench_interning(JackGenerator(seed=seed, **fixed).generate_corpus(16), repeat)}
+
+
+def run_programs(dirs, max_steps=PROGRAM_MAX_STEPS):
+    """
+    Compiles sample programs in memory and runs them headless on the VMEmulator.
+    The executed instruction counts are deterministic, so they catch code generation regressions
+    that timings would hide in noise.
+    No sample program runs yet: the code generator does not compile expressions, let statements and
+    call arguments, so each one stops on a VMEmulator.StackError within its first instructions.
+    Such a run has no instruction count, only its error, until the code generator is complete.
+    :param dirs: list of directories of .jack files, e.g. Pong, Square, Average
+    :param max_steps: int, interactive programs never return on their own
+    :return: dict, program name -> {'instructions', 'seconds', 'functions', 'error'},
+             'instructions' - None if the program stopped on an error,
+             'error' - the message of the emulator error that stopped the program, or None
+    """
+    programs = {}
+    for path in dirs:
+        path = path.rstrip('/')
+        sources = {}
+        for file in JackAnalyzer.jack_files(path):
+            with open(file, 'r') as f:
+                sources[os.path.basename(file)[:-5]] = f.read()
+        emu = VMEmulator.VMEmulator()
+        for name, (xml, vm) in JackAnalyzer.compile_sources(sources).items():
+            emu.load_source(name, vm)
+        emu.decode()
+        start = time.perf_counter()
+        error = None
+        try:
+            emu.run(max_steps=max_steps)
+        except Exception as e:
+            # a program the code generator breaks is reported, the other programs still run
+            error = str(e)
+        programs[os.path.basename(path)] = {'instructions': emu.steps if error is None else None,
+                                            'seconds': time.perf_counter() - start,
+                                            'functions': emu.profile(),
+                                            'error': error}
+    return programs
+
+
+def compare_programs(results, baseline):
+    """
+    :return: list of (program, baseline instructions, current instructions, ratio, error),
+             the instructions None for a run stopped by an error, the ratio None unless both runs have a count,
+             error - the message of the error the current run stopped on, if the baseline run did not stop on it
+    """
+    rows = []
+    for program, current in results.get('programs', {}).items():
+        if program not in baseline.get('programs', {}):
+            continue
+        before_run = baseline['programs'][program]
+        before = before_run['instructions'] if before_run.get('error') is None else None
+        after = current['instructions']
+        ratio = None
+        if before is not None and after is not None:
+            ratio = after / before if before else float('inf')
+        error = current.get('error')
+        if error == before_run.get('error'):
+            error = None
+        rows.append((program, before, after, ratio, error))
+    return rows
+
+
+def program_regressions(rows, tolerance=TOLERANCE):
+    """
+    :param rows: list, as returned by compare_programs
+    :param tolerance: float, relative increase of the executed instructions still accepted
+    :return: the rows of the programs that stop on a new error, or execute more instructions than tolerated
+    """
+    return [row for row in rows if row[4] is not None or (row[3] is not None and row[3] > 1 + tolerance)]
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare(results, baseline):
+    """
+    Compares the phase timings of the cases present in both results.
+    :param results: dict, as returned by run_sweep
+    :param baseline: dict, as returned by run_sweep
+    :return: list of (case, phase, baseline seconds, current seconds, ratio)
+    """
+    rows = []
+    for case, current in results['cases'].items():
+        if case not in baseline['cases']:
+            continue
+        for phase in PHASES:
+            before = baseline['cases'][case][phase]
+            after = current[phase]
+            rows.append((case, phase, before, after, after / before if before else float('inf')))
+    return rows
+
+
+def regressions(rows, tolerance=TOLERANCE):
+    """
+    :param rows: list, as returned by compare
+    :param tolerance: float, relative slowdown still accepted
+    :return: the rows slower than the baseline by more than tolerance
+    """
+    return [row for row in rows if row[-1] > 1 + tolerance]
+
+
+def format_results(results):
+    lines = ['{:<24}{:>10}{:>9}{:>13}{:>13}{:>13}'.format('case', 'bytes', 'tokens', 'tokenizer ms',
+                                                        'engine ms', 'vmwriter ms')]
+    for case, r in results['cases'].items():
+        lines.append('{:<24}{:>10}{:>9}{:>13.2f}{:>13.2f}{:>13.2f}'.format(
+            case, r['source_bytes'], r['tokens'], r['tokenizer'] * 1000, r['engine'] * 1000, r['vmwriter'] * 1000))
+    parser = results.get('parser')
+    if parser:
+        lines.append('nested expressions: ' + ', '.join(
+            '{} {:.2f} ms (chained dispatch {:.2f} ms)'.format(case, r['tables'] * 1000, r['chained'] * 1000)
+            for case, r in parser.items()))
+    table = results.get('symbol_table')
+    if table:
+        lines.append('symbol table: lookup {:.2f} ms, kind_of+index_of {:.2f} ms'.format(
+            table['lookup'] * 1000, table['wrappers'] * 1000))
+    interning = results.get('interning')
+    if interning:
+        lines.append('interning: token streams {} bytes as IDs vs {} bytes as lists, '
+                     'lookup {:.2f} ms canonical vs {:.2f} ms copies'.format(
+                         interning['token_stream_bytes'], interning['token_list_bytes'],
+                         interning['lookup_canonical'] * 1000, interning['lookup_copies'] * 1000))
+    return '\n'.join(lines)
+
+
+def _count(value):
+    return '-' if value is None else value
+
+
+def format_programs(programs):
+    lines = ['{:<24}{:>14}{:>10}'.format('program', 'instructions', 'seconds')]
+    for program, r in programs.items():
+        lines.append('{:<24}{:>14}{:>10.3f}'.format(program, _count(r['instructions']), r['seconds']))
+        if r.get('error'):
+            lines[-1] += '  ERROR: ' + r['error']
+    if programs and all(r.get('error') for r in programs.values()):
+        lines.append('no program ran without an error, there is no instruction count to check for regressions')
+    return '\n'.join(lines)
+
+
+def format_program_comparison(rows, tolerance=TOLERANCE):
+    lines = ['{:<24}{:>14}{:>14}{:>8}'.format('program', 'baseline', 'current', 'ratio')]
+    for program, before, after, ratio, error in rows:
+        if error is not None:
+            mark = '  REGRESSION: ' + error
+        else:
+            mark = '  REGRESSION' if ratio is not None and ratio > 1 + tolerance else ''
+        lines.append('{:<24}{:>14}{:>14}{:>8}{}'.format(program, _count(before), _count(after),
+                                                        '-' if ratio is None else '{:.2f}'.format(ratio), mark))
+    return '\n'.join(lines)
+
+
+def format_comparison(rows, tolerance=TOLERANCE):
+    lines = ['{:<24}{:<11}{:>13}{:>13}{:>8}'.format('case', 'phase', 'baseline ms', 'current ms', 'ratio')]
+    for case, phase, before, after, ratio in rows:
+        mark = '  REGRESSION' if ratio > 1 + tolerance else ''
+        lines.append('{:<24}{:<11}{:>13.2f}{:>13.2f}{:>8.2f}{}'.format(case, phase, before * 1000, after * 1000,
+                                                                      ratio, mark))
+    return '\n'.join(lines)
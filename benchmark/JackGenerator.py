@@ -0,0 +1,203 @@
+import random
+"""
+Seeded generator of syntactically valid Jack classes, used as the benchmark corpus.
+The same seed and parameters always produce the same source.
+The generated code sticks to the subset the CompilationEngine handles:
+calls inside expressions are always qualified (ClassName.subroutine) and only call functions and
+constructors with their declared number of parameters, parameters are of primitive types,
+and strings and comments contain no comment markers.
+"""
+
+PRIMITIVE_TYPES = ['int', 'char', 'boolean']
+OPS = ['+', '-', '*', '/', '&', '|', '<', '>', '=']
+UNARY_OPS = ['-', '~']
+KEYWORD_CONSTANTS = ['true', 'false', 'null', 'this']
+OS_CALLS = [('Math', 'max', 2), ('Math', 'min', 2), ('Math', 'abs', 1), ('Math', 'multiply', 2),
+            ('Output', 'printInt', 1), ('Output', 'println', 0), ('Screen', 'drawPixel', 2),
+            ('Keyboard', 'keyPressed', 0), ('Memory', 'peek', 1)]
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'score', 'paddle', 'ball', 'wall', 'game', 'over',
+         'Press', 'any', 'key', 'to', 'start', 'level', '0123', 'x y', '!?', 'OK']
+
+
+def nested_expression_class(depth, statements=40):
+    """
+    A class of let statements whose expressions nest `depth` levels of parentheses,
+    alternating unary operators, binary operators and calls, to stress the expression parser.
+    :param depth: int
+    :param statements: int
+    :return: String, jack source
+    """
+    expression = 'v'
+    for i in range(depth):
+        if i % 2:
+            expression = '(-{} + {} * v)'.format(expression, i)
+        else:
+            expression = '(~{} | Math.max({}, v))'.format(expression, i)
+    body = '\n'.join('        let v = {};'.format(expression) for _ in range(statements))
+    return 'class Main {{\n    function void main() {{\n        var int v;\n{}\n        return;\n    }}\n}}\n'.format(body)
+
+
+class JackGenerator:
+    def __init__(self, seed=0, fields=4, subroutines=8, statements=8, depth=2,
+                 expression_length=3, string_density=0.1, comment_density=0.1):
+        """
+        :param seed: int, seed of the random generator
+        :param fields: int, number of field and static variables per class
+        :param subroutines: int, number of subroutines per class
+        :param statements: int, number of statements per block
+        :param depth: int, max nesting depth of if/while blocks and of parenthesized expressions
+        :param expression_length: int, max number of terms in an expression
+        :param string_density: float, probability of a term being a string constant
+        :param comment_density: float, probability of a comment before a statement
+        """
+        self.rnd = random.Random(seed)
+        self.fields = fields
+        self.subroutines = subroutines
+        self.statements = statements
+        self.depth = depth
+        self.expression_length = expression_length
+        self.string_density = string_density
+        self.comment_density = comment_density
+
+        self._lines = []
+        self._ints = []
+        self._arrays = []
+        self._class_name = ''
+        self._signatures = []
+
+    def generate_class(self, class_name='Main'):
+        """
+        :param class_name: String
+        :return: String, source of one class
+        """
+        self._lines = []
+        self._emit(0, '/** generated class {} */'.format(class_name))
+        self._emit(0, 'class {} {{'.format(class_name))
+
+        class_ints = []
+        for i in range(self.fields):
+            kind = 'static' if i % 4 == 3 else 'field'
+            name = '{}{}'.format(kind[0], i)
+            self._emit(1, '{} int {};'.format(kind, name))
+            class_ints.append(name)
+
+        # signatures are drawn up front, so calls to the subroutines declared later match them
+        self._class_name = class_name
+        self._signatures = [self._signature(class_name, i) for i in range(self.subroutines)]
+        for i, signature in enumerate(self._signatures):
+            self._subroutine('sub{}'.format(i), signature, class_ints)
+
+        self._emit(0, '}')
+        return '\n'.join(self._lines) + '\n'
+
+    def generate_corpus(self, n_classes):
+        """
+        :param n_classes: int
+        :return: dict, class name -> source
+        """
+        return {'Gen{}'.format(i): self.generate_class('Gen{}'.format(i)) for i in range(n_classes)}
+
+    def _emit(self, indent, line):
+        self._lines.append('    ' * indent + line)
+
+    def _signature(self, class_name, number):
+        rnd = self.rnd
+        if number == 0:
+            return 'constructor', class_name, rnd.randint(0, 3)
+        return rnd.choice(['function', 'method']), rnd.choice(['void', 'int', 'boolean']), rnd.randint(0, 3)
+
+    def _subroutine(self, name, signature, class_ints):
+        rnd = self.rnd
+        kind, ret_type, n_params = signature
+        params = ['a{}'.format(i) for i in range(n_params)]
+        declarations = ', '.join(rnd.choice(PRIMITIVE_TYPES) + ' ' + p for p in params)
+        self._emit(1, '{} {} {}({}) {{'.format(kind, ret_type, name, declarations))
+        local_ints = ['v{}'.format(i) for i in range(rnd.randint(1, 4))]
+        self._emit(2, 'var int {};'.format(', '.join(local_ints)))
+        self._arrays = ['arr{}'.format(i) for i in range(rnd.randint(0, 2))]
+        if self._arrays:
+            self._emit(2, 'var Array {};'.format(', '.join(self._arrays)))
+        self._ints = class_ints + params + local_ints
+
+        self._block(2, self.depth)
+        if ret_type == 'void':
+            self._emit(2, 'return;')
+        elif kind == 'constructor':
+            self._emit(2, 'return this;')
+        else:
+            self._emit(2, 'return {};'.format(self._expression(self.depth)))
+        self._emit(1, '}')
+
+    def _block(self, indent, depth):
+        for _ in range(self.statements):
+            self._statement(indent, depth)
+
+    def _statement(self, indent, depth):
+        rnd = self.rnd
+        if rnd.random() < self.comment_density:
+            if rnd.random() < 0.5:
+                self._emit(indent, '// ' + self._words())
+            else:
+                self._emit(indent, '/* ' + self._words() + ' */')
+
+        choice = rnd.random()
+        if depth > 0 and choice < 0.15:
+            self._emit(indent, 'if ({}) {{'.format(self._expression(depth - 1)))
+            self._block(indent + 1, depth - 1)
+            if rnd.random() < 0.5:
+                self._emit(indent, '} else {')
+                self._block(indent + 1, depth - 1)
+            self._emit(indent, '}')
+        elif depth > 0 and choice < 0.25:
+            self._emit(indent, 'while ({}) {{'.format(self._expression(depth - 1)))
+            self._block(indent + 1, depth - 1)
+            self._emit(indent, '}')
+        elif choice < 0.4:
+            self._emit(indent, 'do {};'.format(self._call(depth)))
+        elif self._arrays and choice < 0.5:
+            self._emit(indent, 'let {}[{}] = {};'.format(rnd.choice(self._arrays), self._expression(depth),
+                                                          self._expression(depth)))
+        else:
+            self._emit(indent, 'let {} = {};'.format(rnd.choice(self._ints), self._expression(depth)))
+
+    def _expression(self, depth):
+        rnd = self.rnd
+        terms = [self._term(depth)]
+        for _ in range(rnd.randint(0, self.expression_length - 1)):
+            terms.append(rnd.choice(OPS))
+            terms.append(self._term(depth))
+        return ' '.join(terms)
+
+    def _term(self, depth):
+        rnd = self.rnd
+        if rnd.random() < self.string_density:
+            return '"{}"'.format(self._words())
+        choice = rnd.random()
+        if depth > 0 and choice < 0.2:
+            return '({})'.format(self._expression(depth - 1))
+        elif depth > 0 and choice < 0.3:
+            return rnd.choice(UNARY_OPS) + self._term(depth - 1)
+        elif depth > 0 and choice < 0.4:
+            return self._call(depth - 1)
+        elif self._arrays and choice < 0.5:
+            return '{}[{}]'.format(rnd.choice(self._arrays), self._expression(depth - 1) if depth else '0')
+        elif choice < 0.65:
+            return str(rnd.randint(0, 32767))
+        elif choice < 0.7:
+            return rnd.choice(KEYWORD_CONSTANTS)
+        else:
+            return rnd.choice(self._ints)
+
+    def _call(self, depth):
+        rnd = self.rnd
+        if rnd.random() < 0.5:
+            class_name, name, n_args = rnd.choice(OS_CALLS)
+            callee = class_name + '.' + name
+        else:
+            number = rnd.choice([i for i, signature in enumerate(self._signatures) if signature[0] != 'method'])
+            callee = '{}.sub{}'.format(self._class_name, number)
+            n_args = self._signatures[number][2]
+        return '{}({})'.format(callee, ', '.join(self._expression(depth) for _ in range(n_args)))
+
+    def _words(self):
+        return ' '.join(self.rnd.choice(WORDS) for _ in range(self.rnd.randint(1, 6)))
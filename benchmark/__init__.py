@@ -0,0 +1,10 @@
+"""
+Performance benchmarks of the Jack compiler.
+JackGenerator builds a seeded synthetic corpus, Harness times the JackTokenizer,
+the CompilationEngine and the VMWriter separately over size sweeps, records the results
+as JSON and compares them with a saved baseline.
+With --programs it also compiles sample programs and runs them on the VMEmulator,
+comparing executed instruction counts.
+With --memory it measures the peak memory per source byte instead, against an upper bound.
+Run with: python -m benchmark --help
+"""
@@ -0,0 +1,64 @@
+from benchmark import Harness
+import argparse
+import sys
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Jack compiler benchmarks')
+    parser.add_argument('--sweep', default='subroutines', choices=Harness.SWEEP_PARAMETERS,
+                        help='generator parameter to sweep')
+    parser.add_argument('--values', default='4,16,64,256',
+                        help='comma separated values of the swept parameter')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the best is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=Harness.TOLERANCE,
+                        help='relative slowdown accepted before reporting a regression')
+    parser.add_argument('--memory', action='store_true',
+                        help='measure peak memory instead of time and check it against --max-bytes-per-source-byte')
+    parser.add_argument('--max-bytes-per-source-byte', type=float, default=Harness.MAX_BYTES_PER_SOURCE_BYTE,
+                        help='upper bound of the peak memory of a compilation per byte of source')
+    parser.add_argument('--programs', metavar='DIRS',
+                        help='comma separated directories of Jack programs to compile and run on the VMEmulator')
+    parser.add_argument('--max-steps', type=int, default=Harness.PROGRAM_MAX_STEPS,
+                        help='VM instructions executed per program at most')
+    args = parser.parse_args(args)
+
+    cast = float if args.sweep.endswith('density') else int
+    values = [cast(value) for value in args.values.split(',')]
+    if args.memory:
+        cases = Harness.run_memory_sweep(args.sweep, values, args.seed)
+        print(Harness.format_memory(cases))
+        if args.output:
+            Harness.save({'memory': cases}, args.output)
+        over = Harness.over_memory_bound(cases, args.max_bytes_per_source_byte)
+        for case in over:
+            print('{}: over {} bytes per source byte'.format(case, args.max_bytes_per_source_byte))
+        return 1 if over else 0
+
+    results = Harness.run_sweep(args.sweep, values, args.repeat, args.seed)
+    print(Harness.format_results(results))
+    if args.programs:
+        results['programs'] = Harness.run_programs(args.programs.split(','), args.max_steps)
+        print()
+        print(Harness.format_programs(results['programs']))
+    if args.output:
+        Harness.save(results, args.output)
+
+    if args.baseline:
+        baseline = Harness.load(args.baseline)
+        rows = Harness.compare(results, baseline)
+        print()
+        print(Harness.format_comparison(rows, args.tolerance))
+        program_rows = Harness.compare_programs(results, baseline)
+        if program_rows:
+            print()
+            print(Harness.format_program_comparison(program_rows, args.tolerance))
+        if Harness.regressions(rows, args.tolerance) or Harness.program_regressions(program_rows, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())